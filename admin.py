@@ -3,6 +3,7 @@ from discord.ext import commands
 import random
 import os
 import asyncio
+import statistics
 from discord.ext.commands import has_permissions
 
 class AdminCog(commands.Cog):
@@ -170,12 +171,73 @@ class AdminCog(commands.Cog):
         except Exception as e:
             await ctx.send(f"Error removing balance: {str(e)}")
 
+    @commands.command()
+    @has_permissions(administrator=True)
+    async def botstats(self, ctx):
+        """Show internal counters of the bot"""
+        embed = discord.Embed(
+            title="Bot Stats",
+            color=discord.Color.blue()
+        )
+
+        levels_cog = self.client.get_cog("LevelsCog")
+        if levels_cog:
+            xp = levels_cog.xp_limiter.stats()
+            embed.add_field(
+                name="XP Rate Limiter",
+                value=f"Active chatters: {xp['tracked']}\n"
+                      f"Messages rewarded: {xp['allowed']}\n"
+                      f"Messages throttled: {xp['throttled']}\n"
+                      f"Idle users evicted: {xp['evicted']}",
+                inline=False
+            )
+
+        lastfm_cog = self.client.get_cog("LastFMCog")
+        if lastfm_cog:
+            cache = lastfm_cog.api.cache.stats()
+            embed.add_field(
+                name="Last.fm Cache",
+                value=f"Cached responses: {cache['size']}\n"
+                      f"Hits: {cache['hits']} • Misses: {cache['misses']} ({cache['hit_rate']:.0%} hit rate)",
+                inline=False
+            )
+            api = lastfm_cog.api.stats()
+            embed.add_field(
+                name="Last.fm API",
+                value=f"Requests sent: {api['requests']}\n"
+                      f"Throttled: {api['throttled']} ({api['throttle_wait']:.1f}s waited)\n"
+                      f"Retried: {api['retried']} • Coalesced: {api['coalesced']} • Failed: {api['failed']}",
+                inline=False
+            )
+            poller = lastfm_cog.poller.stats()
+            embed.add_field(
+                name="Now Playing Poller",
+                value=f"Accounts polled: {poller['tracked']} • Playing: {poller['playing']}\n"
+                      f"Polls: {poller['polls']} • Errors: {poller['errors']}",
+                inline=False
+            )
+
+        if lastfm_cog and lastfm_cog.np_latency:
+            timings = list(lastfm_cog.np_latency)
+            totals = sorted(t[0] for t in timings)
+            p95 = totals[min(len(totals) - 1, int(len(totals) * 0.95))]
+            recent, info, send = (sum(t[i] for t in timings) / len(timings) for i in range(1, 4))
+            embed.add_field(
+                name="-np Latency",
+                value=f"Last {len(totals)} calls: p50 **{statistics.median(totals):.0f} ms**, p95 **{p95:.0f} ms**\n"
+                      f"Average: recent track {recent:.0f} ms • scrobble counts {info:.0f} ms • send {send:.0f} ms",
+                inline=False
+            )
+
+        await ctx.send(embed=embed)
+
     @ban.error
     @kick.error
     # @mute.error
     # @unmute.error
     @addbalance.error
     @removebalance.error
+    @botstats.error
     async def admin_command_error(self, ctx, error):
         if isinstance(error, commands.MissingPermissions):
             embed = discord.Embed(
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import os
+import time
+
+from econstats import DAY, INFLOW_DAYS, EconomyStats
+from ledger import TransactionLedger
+from locks import StripedLocks
+from ranking import RankIndex
+from storage import get_backend, io_executor, run_io
+
+# Commits with more changes than this (an interest payout) are encoded on the I/O
+# thread; smaller ones are cheaper to encode on the loop than to pass the GIL back and forth
+ENCODE_ON_IO_THREAD = 1000
+
+
+class BankStore:
+    """Process-wide, in-memory copy of the bank collection shared by every economy cog.
+
+    Reads are plain dict lookups. Every balance change goes through ``apply``, which
+    updates memory and appends one line to an append-only journal. A background
+    compactor folds the journal into a snapshot (the storage backend) once it grows
+    past ``compact_bytes``; on startup the snapshot is loaded and the journal replayed.
+
+    Journal entries also carry the balances *after* the change, so replaying an entry
+    that already made it into the snapshot is harmless. Changes that must happen
+    together (a transfer) are journaled as one line, so a crash keeps all or none.
+
+    All file I/O runs on the storage I/O thread; journal appends are queued there
+    without waiting, and the single worker keeps them in order. Every change is also
+    appended to a transaction ledger, which keeps the history the snapshot folds away.
+    A failed append is logged and triggers a compaction right away, so the snapshot
+    catches up with memory instead of waiting for the journal to grow.
+
+    ``marks`` holds small values that must change atomically with a commit, such as the
+    last interest period paid. They ride in the same journal line and are saved to the
+    "bank_marks" document with the snapshot.
+    """
+
+    def __init__(self, backend=None, journal_path='data/bank.journal',
+                 compact_interval=30, compact_bytes=256 * 1024,
+                 ledger_path='data/transactions.ledger'):
+        self.backend = backend
+        self.journal_path = journal_path
+        self.rotated_path = f"{journal_path}.1"  # journal being folded into a snapshot
+        self.compact_interval = compact_interval
+        self.compact_bytes = compact_bytes
+        self.users = {}
+        self.loaded = False
+        self.dirty = set()  # accounts changed since the last snapshot
+        self.journal_bytes = 0  # appended since the last compaction, counted on the I/O thread
+        self.marks = {}
+        self.marks_dirty = False  # marks changed since the last snapshot
+        self.ranking = RankIndex()  # total balance (wallet + bank) per account
+        self.ledger = TransactionLedger(ledger_path)
+        self.stats = EconomyStats()  # supply, distribution and inflow, updated on every change
+        self.write_failed = False  # an append failed since the last snapshot
+        self._journal = None
+        self._compact_task = None
+        self._compact_lock = asyncio.Lock()
+        self._compact_now = asyncio.Event()
+        self._loop = None  # the bot's loop, to reach the compactor from the I/O thread
+
+    def load(self):
+        if self.backend is None:
+            self.backend = get_backend()
+        self.users = self.backend.load("bank")
+        self.marks = self.backend.load_document("bank_marks", {})
+        self.dirty.clear()
+        self.marks_dirty = False
+        replayed = self.replay_journal()
+        if replayed:
+            print(f"Replayed {replayed} bank journal entries")
+        self.ranking.rebuild({
+            user_id: account.get("wallet", 0) + account.get("bank", 0)
+            for user_id, account in self.users.items()
+        })
+        self._journal = open(self.journal_path, 'a')
+        # Journal entries were ledgered when they were made, replaying doesn't add them again
+        self.ledger.load()
+        # Inflow per day comes from the end of the ledger, the rest from the balances
+        today = int(time.time() // DAY)
+        self.stats.rebuild(
+            ((account.get("wallet", 0), account.get("bank", 0)) for account in self.users.values()),
+            self.ledger.since((today - INFLOW_DAYS + 1) * DAY)
+        )
+        self.loaded = True
+        return self.users
+
+    def replay_journal(self):
+        """Apply journal entries written after the last snapshot, returns how many"""
+        replayed = 0
+        # A leftover rotated journal means a compaction didn't finish, it comes first
+        for path in (self.rotated_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn final line from a crash mid-append
+                    for change in entry.get("batch", [entry]):
+                        account = self.users.setdefault(change["user"], {"wallet": 0, "bank": 0})
+                        account["wallet"] = change["wallet_after"]
+                        account["bank"] = change["bank_after"]
+                        self.dirty.add(change["user"])
+                    if entry.get("marks"):
+                        self.marks.update(entry["marks"])
+                        self.marks_dirty = True
+                    replayed += 1
+        return replayed
+
+    def get_bank_data(self):
+        if not self.loaded:
+            self.load()
+        return self.users
+
+    def open_account(self, user_id, wallet=50, bank=0, **extra):
+        """Create an account if it doesn't exist yet, returns True if one was created"""
+        users = self.get_bank_data()
+        user_id = str(user_id)
+
+        if user_id in users:
+            return False
+
+        account = self.apply(user_id, wallet=wallet, bank=bank, reason="open")
+        account.update(extra)
+        return True
+
+    def apply(self, user_id, wallet=0, bank=0, reason=""):
+        """Add the given deltas to an account and journal the change, returns the account"""
+        entry = self._change(user_id, wallet, bank, reason, time.time())
+        self._commit(entry, [entry])
+        return self.users[entry["user"]]
+
+    def apply_many(self, changes, reason="", marks=None):
+        """Apply (user_id, wallet, bank) deltas as one journal entry, all or nothing on a crash.
+
+        ``marks`` are stored in the same entry. Returns the accounts in the order given.
+        """
+        now = time.time()
+        moves = []
+        entries = [self._change(user_id, wallet, bank, reason, now, moves) for user_id, wallet, bank in changes]
+        self.stats.change_many(moves, reason, now)
+        self.ranking.update_many({entry["user"]: entry["wallet_after"] + entry["bank_after"] for entry in entries})
+        journal_entry = {"batch": entries, "reason": reason, "time": now}
+        if marks:
+            self.marks.update(marks)
+            self.marks_dirty = True
+            journal_entry["marks"] = dict(marks)
+        self._commit(journal_entry, entries)
+        return [self.users[entry["user"]] for entry in entries]
+
+    def transfer(self, sender_id, receiver_id, amount, reason="pay"):
+        """Move coins between two wallets in one commit, returns (sender, receiver) accounts.
+
+        The caller checks the sender's balance while holding both accounts' locks.
+        """
+        return self.apply_many([(sender_id, -amount, 0), (receiver_id, amount, 0)], reason=reason)
+
+    def _change(self, user_id, wallet, bank, reason, now, batch=None):
+        # With a batch list, stats and ranking are left to the caller
+        users = self.get_bank_data()
+        user_id = str(user_id)
+
+        account = users.get(user_id)
+        if account is None:
+            account = users[user_id] = {"wallet": 0, "bank": 0}
+            old_total = None
+        else:
+            old_total = account["wallet"] + account["bank"]
+        account["wallet"] += wallet
+        account["bank"] += bank
+        if batch is None:
+            self.stats.change(old_total, wallet, bank, reason, now)
+            self.ranking.update(user_id, account["wallet"] + account["bank"])
+        else:
+            batch.append((old_total, wallet, bank))
+        self.dirty.add(user_id)
+
+        return {
+            "user": user_id,
+            "wallet": wallet,
+            "bank": bank,
+            "wallet_after": account["wallet"],
+            "bank_after": account["bank"],
+            "reason": reason,
+            "time": now,
+        }
+
+    def _commit(self, journal_entry, entries):
+        # Journal line and ledger records go to the I/O thread as one job
+        self.ledger.reserve(entries)
+        if len(entries) > ENCODE_ON_IO_THREAD:
+            # The entries are never changed after this, so encoding them there is safe
+            future = io_executor.submit(self._encode_append, journal_entry, entries)
+        else:
+            future = io_executor.submit(self._append, *self._encode(journal_entry, entries))
+        future.add_done_callback(self._append_done)
+
+    def _encode(self, journal_entry, entries):
+        if "batch" in journal_entry:
+            # The batch carries reason and time once, replay only needs the balances
+            journal_entry = dict(journal_entry, batch=[
+                {key: entry[key] for key in ("user", "wallet", "bank", "wallet_after", "bank_after")}
+                for entry in entries
+            ])
+        return json.dumps(journal_entry) + "\n", self.ledger.pack(entries)
+
+    def _encode_append(self, journal_entry, entries):
+        self._append(*self._encode(journal_entry, entries))
+
+    def _append(self, line, records):
+        self._journal.write(line)
+        self._journal.flush()
+        self.journal_bytes += len(line)
+        self.ledger.write(records)
+
+    def _append_done(self, future):
+        # Runs on the I/O thread once the append finished
+        error = future.exception()
+        if error is None:
+            return
+        print(f"Error writing bank journal: {error!r}")
+        self.write_failed = True
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._compact_now.set)
+
+    def _rotate_journal(self):
+        """Move the current journal aside and start a new one (runs on the I/O thread)"""
+        self._journal.close()
+        if os.path.exists(self.rotated_path):
+            # The previous compaction failed, keep its entries in front of ours
+            with open(self.journal_path, 'r') as src, open(self.rotated_path, 'a') as dst:
+                dst.write(src.read())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.rotated_path)
+        self._journal = open(self.journal_path, 'a')
+        self.journal_bytes = 0
+
+    async def compact(self):
+        """Fold the journal into a snapshot and start a fresh journal"""
+        async with self._compact_lock:
+            await self._compact()
+
+    async def _compact(self):
+        if not self.loaded or not (self.dirty or self.marks_dirty):
+            return
+        dirty, self.dirty = self.dirty, set()
+        marks_dirty, self.marks_dirty = self.marks_dirty, False
+        write_failed, self.write_failed = self.write_failed, False
+
+        # Copy on the loop so the I/O thread never sees a dict that is being mutated.
+        # Everything in this copy was journaled before the rotation below.
+        if self.backend.partial_writes:
+            snapshot = {k: dict(self.users[k]) for k in dirty if k in self.users}
+        else:
+            snapshot = {k: dict(v) for k, v in self.users.items()}
+        marks = dict(self.marks)
+
+        try:
+            await run_io(self._rotate_journal)
+            await run_io(self.backend.save, "bank", snapshot, dirty)
+            if marks_dirty:
+                await run_io(self.backend.save_document, "bank_marks", marks)
+        except Exception:
+            self.dirty |= dirty
+            self.marks_dirty = self.marks_dirty or marks_dirty
+            self.write_failed = self.write_failed or write_failed
+            raise
+
+        # Only drop the old journal once the snapshot is safely written
+        await run_io(os.remove, self.rotated_path)
+
+    async def start(self):
+        """Load the bank and start the background compactor"""
+        if not self.loaded:
+            await run_io(self.load)
+        self._loop = asyncio.get_running_loop()
+        if self._compact_task is None or self._compact_task.done():
+            self._compact_task = asyncio.create_task(self._compact_loop())
+
+    async def _compact_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._compact_now.wait(), self.compact_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._compact_now.clear()
+            if self.journal_bytes < self.compact_bytes and not self.write_failed:
+                continue
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"Error compacting bank journal: {e}")
+
+    async def close(self):
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            self._compact_task = None
+        await self.compact()
+        await run_io(self.ledger.close)
+
+
+bank_store = BankStore()
+# Hold an account's lock from reading its balance until the change is applied
+account_locks = StripedLocks()
@@ -0,0 +1,188 @@
+"""Fire thousands of concurrent balance mutations and check that no update is lost.
+
+Each task mimics a command: it checks a balance, yields to the event loop (where the
+real command would ``await ctx.send``) and then applies the change. Withdrawals,
+deposits, gambles and two-account transfers are mixed over a small set of accounts so
+tasks collide constantly. Every task logs whether it went ahead, in the order that took
+effect. Replaying that log one operation at a time, with each balance check made again,
+must accept and reject the same operations and end on the same balances. No balance
+may be negative, and a fresh store loaded from disk must hold the same balances and
+transaction count.
+
+The same workload is also run with the locks disabled; it must fail the replay check.
+
+    python benchmarks/bank_stress.py [tasks] [accounts]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank import BankStore  # noqa: E402
+from locks import StripedLocks  # noqa: E402
+from storage import JsonBackend  # noqa: E402
+
+START_WALLET = 1000
+START_BANK = 1000
+
+
+class NoLocks:
+    contended = 0
+
+    @asynccontextmanager
+    async def hold(self, *user_ids):
+        yield
+
+
+async def deposit(store, locks, user_id, rng, log):
+    amount = rng.randint(1, 200)
+    async with locks.hold(user_id):
+        if amount > store.users[user_id]["wallet"]:
+            log.append(("deposit", user_id, None, amount, False))
+            return
+        await asyncio.sleep(0)
+        store.apply(user_id, wallet=-amount, bank=amount, reason="deposit")
+        log.append(("deposit", user_id, None, amount, True))
+
+
+async def withdraw(store, locks, user_id, rng, log):
+    amount = rng.randint(1, 200)
+    async with locks.hold(user_id):
+        if amount > store.users[user_id]["bank"]:
+            log.append(("withdraw", user_id, None, amount, False))
+            return
+        await asyncio.sleep(0)
+        store.apply(user_id, wallet=amount, bank=-amount, reason="withdraw")
+        log.append(("withdraw", user_id, None, amount, True))
+
+
+async def gamble(store, locks, user_id, rng, log):
+    amount = rng.randint(1, 100)
+    won = rng.random() < 0.5
+    async with locks.hold(user_id):
+        if amount > store.users[user_id]["wallet"]:
+            log.append(("win" if won else "lose", user_id, None, amount, False))
+            return
+        await asyncio.sleep(0)
+        store.apply(user_id, wallet=amount if won else -amount, reason="gamble")
+        log.append(("win" if won else "lose", user_id, None, amount, True))
+
+
+async def transfer(store, locks, sender, rng, accounts, log):
+    receiver = rng.choice(accounts)
+    if receiver == sender:
+        return
+    amount = rng.randint(1, 150)
+    async with locks.hold(sender, receiver):
+        if amount > store.users[sender]["wallet"]:
+            log.append(("transfer", sender, receiver, amount, False))
+            return
+        await asyncio.sleep(0)
+        store.transfer(sender, receiver, amount)
+        log.append(("transfer", sender, receiver, amount, True))
+
+
+def replay(log, accounts):
+    """Redo the logged operations one at a time, checking each balance again.
+
+    Returns the balances it ends with and how many operations were accepted or rejected
+    differently than in the concurrent run. A lost update (a change made on a balance
+    that another task changed after the check) shows up in both.
+    """
+    balances = {user_id: {"wallet": START_WALLET, "bank": START_BANK} for user_id in accounts}
+    differ = 0
+    for kind, user_id, other, amount, accepted in log:
+        account = balances[user_id]
+        allowed = amount <= account["bank" if kind == "withdraw" else "wallet"]
+        if allowed != accepted:
+            differ += 1
+        if not allowed:
+            continue
+        if kind == "deposit":
+            account["wallet"] -= amount
+            account["bank"] += amount
+        elif kind == "withdraw":
+            account["wallet"] += amount
+            account["bank"] -= amount
+        elif kind == "win":
+            account["wallet"] += amount
+        elif kind == "lose":
+            account["wallet"] -= amount
+        else:
+            account["wallet"] -= amount
+            balances[other]["wallet"] += amount
+    return balances, differ
+
+
+async def run(tasks, account_count, locks, seed=1):
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+    os.makedirs("data")
+
+    store = BankStore(backend=JsonBackend(), journal_path="data/bank.journal")
+    store.load()
+    accounts = [str(i) for i in range(account_count)]
+    for user_id in accounts:
+        store.open_account(user_id, wallet=START_WALLET, bank=START_BANK)
+
+    rng = random.Random(seed)
+    operations = [deposit, withdraw, gamble]
+    log = []  # (kind, user, other user, amount, accepted), in the order they took effect
+    jobs = []
+    for _ in range(tasks):
+        user_id = rng.choice(accounts)
+        if rng.random() < 0.3:
+            jobs.append(transfer(store, locks, user_id, rng, accounts, log))
+        else:
+            jobs.append(rng.choice(operations)(store, locks, user_id, rng, log))
+
+    started = time.perf_counter()
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - started
+
+    negative = sum(1 for account in store.users.values() if account["wallet"] < 0 or account["bank"] < 0)
+    expected, differ = replay(log, accounts)
+    serializable = differ == 0 and expected == {
+        user_id: {"wallet": account["wallet"], "bank": account["bank"]}
+        for user_id, account in store.users.items()
+    }
+
+    # Compaction runs after the queued journal appends, then reload everything from disk
+    await store.compact()
+    reloaded = BankStore(backend=JsonBackend(), journal_path="data/bank.journal")
+    reloaded.load()
+    # Every change must also be in the ledger, once
+    reload_matches = reloaded.users == store.users and reloaded.ledger.count == store.ledger.count
+    return elapsed, negative, differ, serializable, reload_matches, locks.contended
+
+
+def report(name, elapsed, negative, differ, serializable, reload_matches, contended):
+    print(f"{name:>9}: {elapsed:6.3f}s, contended {contended:6d}, negative balances {negative:4d}, "
+          f"decisions differing from a serial run {differ:5d}, serializable {serializable}, "
+          f"reload matches {reload_matches}")
+
+
+async def main(tasks, account_count):
+    print(f"{tasks} concurrent mutations over {account_count} accounts")
+    locked = await run(tasks, account_count, StripedLocks())
+    report("locked", *locked)
+    unlocked = await run(tasks, account_count, NoLocks())
+    report("unlocked", *unlocked)
+
+    _, negative, _, serializable, reload_matches, _ = locked
+    assert negative == 0, "a balance went negative under the locks"
+    assert serializable, "the locked run doesn't match running the same operations one at a time"
+    assert reload_matches, "balances on disk don't match the ones in memory"
+    assert not unlocked[3], "the serial replay didn't catch the unlocked run's lost updates"
+    print("OK")
+
+
+if __name__ == "__main__":
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    account_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(tasks, account_count))
@@ -0,0 +1,108 @@
+"""Check the incremental -economy statistics against a full scan, and time them.
+
+Runs random begs, work, gambles, deposits and payments through BankStore, then
+compares the running supply, the sketch's percentiles and Gini coefficient with
+exact values computed from every account. Query time should not depend on the
+number of accounts. Finally the store is reloaded and the rebuilt statistics
+(including today's inflow, read back from the ledger) must match.
+
+    python benchmarks/economy_stats.py [accounts] [mutations]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank import BankStore  # noqa: E402
+from storage import JsonBackend  # noqa: E402
+
+
+def exact_quantile(values, q):
+    return values[int(q * (len(values) - 1))]
+
+
+def exact_gini(values):
+    n = len(values)
+    total = sum(values)
+    weighted = sum((i + 1) * value for i, value in enumerate(values))
+    return (2 * weighted) / (n * total) - (n + 1) / n
+
+
+def new_store():
+    return BankStore(backend=JsonBackend(), journal_path="data/bank.journal")
+
+
+async def run(account_count, mutations, seed=1):
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs("data")
+    store = new_store()
+    store.load()
+    rng = random.Random(seed)
+    accounts = [str(1000 + i) for i in range(account_count)]
+    for user_id in accounts:
+        store.open_account(user_id, wallet=int(rng.paretovariate(1.2) * 50))
+
+    started = time.perf_counter()
+    for _ in range(mutations):
+        user_id = rng.choice(accounts)
+        account = store.users[user_id]
+        kind = rng.random()
+        if kind < 0.3:
+            store.apply(user_id, wallet=rng.randrange(101), reason="beg")
+        elif kind < 0.5:
+            store.apply(user_id, wallet=rng.randint(150, 400), reason="work")
+        elif kind < 0.7 and account["wallet"] > 0:
+            amount = rng.randint(1, account["wallet"])
+            store.apply(user_id, wallet=amount if rng.random() < 0.5 else -amount, reason="gamble")
+        elif kind < 0.85 and account["wallet"] > 0:
+            amount = rng.randint(1, account["wallet"])
+            store.apply(user_id, wallet=-amount, bank=amount, reason="deposit")
+        elif account["wallet"] > 0:
+            receiver = rng.choice(accounts)
+            if receiver != user_id:
+                store.transfer(user_id, receiver, rng.randint(1, account["wallet"]))
+    per_change = (time.perf_counter() - started) / mutations
+
+    stats = store.stats
+    started = time.perf_counter()
+    for _ in range(100):
+        figures = [stats.sketch.quantile(q) for q in (0.5, 0.9, 0.99)] + [stats.sketch.gini()]
+    query = (time.perf_counter() - started) / 100
+
+    totals = sorted(account["wallet"] + account["bank"] for account in store.users.values())
+    assert stats.wallet == sum(account["wallet"] for account in store.users.values())
+    assert stats.bank == sum(account["bank"] for account in store.users.values())
+    assert stats.accounts == len(store.users)
+    exact = [exact_quantile(totals, q) for q in (0.5, 0.9, 0.99)] + [exact_gini(totals)]
+    errors = [abs(a - e) / max(abs(e), 1) for a, e in zip(figures, exact)]
+    print(f"{account_count:7d} accounts: {per_change * 1e6:5.1f} µs per change, {query * 1e6:6.0f} µs per query, "
+          f"p50/p90/p99/gini error {' '.join(f'{error:.2%}' for error in errors)}")
+    # Percentiles are within alpha, give or take rounding to a whole coin
+    assert all(error <= stats.alpha + 0.5 / max(abs(e), 1) for error, e in zip(errors[:3], exact)), \
+        "a percentile is off by more than alpha"
+    assert errors[3] <= 0.03, "the Gini coefficient drifted from the exact figure"
+
+    now = time.time()
+    inflow = stats.inflow_since(now)
+    await store.close()
+    reloaded = new_store()
+    reloaded.load()
+    assert (reloaded.stats.wallet, reloaded.stats.bank) == (stats.wallet, stats.bank)
+    assert reloaded.stats.sketch.counts == stats.sketch.counts
+    assert reloaded.stats.inflow_since(now) == inflow, "inflow rebuilt from the ledger differs"
+
+
+async def main(account_count, mutations):
+    for count in (1000, account_count):
+        await run(count, mutations)
+    print("OK")
+
+
+if __name__ == "__main__":
+    account_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    mutations = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    asyncio.run(main(account_count, mutations))
@@ -0,0 +1,104 @@
+"""Time a daily interest payout and a multi-day catch-up over many accounts.
+
+Checks the one-pass ``accrue`` against paying period by period with
+``period_interest``, then runs InterestSchedule in a temporary data directory as if
+the bot had been offline for several days: the catch-up must pay exactly once, land
+in a single journal line and survive a reload.
+
+    python benchmarks/interest_accrual.py [accounts] [missed_days]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank import BankStore  # noqa: E402
+from interest import PERIOD, InterestSchedule, accrue, period_interest  # noqa: E402
+from storage import JsonBackend, run_io  # noqa: E402
+
+
+def reference(balances, periods):
+    result = array('q')
+    for balance in balances:
+        for _ in range(periods):
+            balance += max(0, period_interest(balance))
+        result.append(balance)
+    return result
+
+
+async def main(account_count, missed):
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs("data")
+    rng = random.Random(1)
+    # Heavy-tailed balances, so every bracket and the cap are exercised
+    balances = array('q', (int(rng.paretovariate(1.2) * 100) for _ in range(account_count)))
+
+    for periods in (1, missed):
+        started = time.perf_counter()
+        result = accrue(balances, periods)
+        elapsed = time.perf_counter() - started
+        assert result == reference(balances, periods), "one-pass accrual differs from period by period"
+        print(f"accrue {account_count} accounts x {periods:3d} periods: {elapsed * 1000:7.1f} ms")
+
+    store = BankStore(backend=JsonBackend(), journal_path="data/bank.journal")
+    store.load()
+    for i, balance in enumerate(balances):
+        store.users[str(i)] = {"wallet": 0, "bank": balance}
+    store.ranking.rebuild({user_id: account["bank"] for user_id, account in store.users.items()})
+    store.stats.rebuild((0, balance) for balance in balances)
+
+    schedule = InterestSchedule(store)
+    today = schedule.current_period()
+    schedule.last_period = today - missed
+    journal_before = store.journal_bytes
+
+    # Longest the loop goes without running anything else during the payout
+    stalls = []
+
+    async def ticker():
+        while True:
+            tick = time.perf_counter()
+            await asyncio.sleep(0)
+            stalls.append(time.perf_counter() - tick)
+
+    ticking = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    paid = await schedule.accrue()
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0)  # let the ticker record the stall that ends here
+    ticking.cancel()
+    await run_io(int)  # wait for the journal line to be written
+    print(f"catch up {missed} periods and commit: {elapsed * 1000:7.1f} ms, {paid} coins, "
+          f"longest loop stall {max(stalls) * 1000:.1f} ms, "
+          f"{(store.journal_bytes - journal_before) / 1e6:.1f} MB journal line")
+
+    expected = accrue(balances, missed)
+    assert all(store.users[str(i)]["bank"] == balance for i, balance in enumerate(expected))
+    assert await schedule.accrue() == 0, "the same period was paid twice"
+    assert await schedule.accrue(now=(today + 1) * PERIOD) > 0, "the next period wasn't paid"
+
+    # As after a crash before any snapshot: the period comes back from the journal with the payout
+    await run_io(int)
+    replayed = BankStore(backend=JsonBackend(), journal_path="data/bank.journal")
+    await run_io(replayed.load)
+    assert replayed.users == store.users and replayed.marks == {"interest": today + 1}
+    await run_io(replayed.ledger.close)
+
+    await store.close()
+    reloaded = BankStore(backend=JsonBackend(), journal_path="data/bank.journal")
+    reloaded.load()
+    assert reloaded.users == store.users, "balances on disk don't match the ones in memory"
+    assert reloaded.ledger.count == store.ledger.count
+    assert reloaded.marks == {"interest": today + 1}, "the paid period wasn't saved with the snapshot"
+    print("OK")
+
+
+if __name__ == "__main__":
+    account_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    missed = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    asyncio.run(main(account_count, missed))
@@ -0,0 +1,67 @@
+"""Time -transactions pages against a large transaction ledger.
+
+Appends ``records`` transactions spread over ``accounts`` users through BankStore,
+reloads the store (rebuilding the per-user index from the file) and times reading the
+newest, a middle and the oldest page of one user's history. Page reads should cost
+the same wherever they are in the history.
+
+    python benchmarks/ledger_history.py [records] [accounts]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank import BankStore  # noqa: E402
+from ledger import RECORD  # noqa: E402
+from storage import JsonBackend, run_io  # noqa: E402
+
+
+def new_store():
+    return BankStore(backend=JsonBackend(), journal_path="data/bank.journal")
+
+
+async def main(records, account_count):
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs("data")
+    store = new_store()
+    store.load()
+
+    rng = random.Random(1)
+    accounts = [str(1000 + i) for i in range(account_count)]
+    reasons = ["beg", "work", "gamble", "deposit", "withdraw"]
+    started = time.perf_counter()
+    for _ in range(records):
+        store.apply(rng.choice(accounts), wallet=rng.randint(-50, 100), reason=rng.choice(reasons))
+    await store.close()
+    print(f"appended {records} records in {time.perf_counter() - started:.2f}s, "
+          f"{os.path.getsize(store.ledger.path) / 1e6:.1f} MB ({RECORD.size} bytes each)")
+
+    store = new_store()
+    started = time.perf_counter()
+    await run_io(store.load)
+    print(f"reload with index rebuild: {time.perf_counter() - started:.2f}s")
+
+    user_id = accounts[0]
+    pages = (store.ledger.count_for(user_id) + 9) // 10
+    for name, page in (("newest", 1), ("middle", pages // 2), ("oldest", pages)):
+        started = time.perf_counter()
+        for _ in range(100):
+            history = await store.ledger.history(user_id, page)
+        elapsed = (time.perf_counter() - started) / 100
+        assert history and all(transaction.user == user_id for transaction in history)
+        print(f"{name:>6} page ({page}/{pages}): {elapsed * 1e6:7.0f} µs")
+
+    newest = await store.ledger.history(user_id, 1)
+    assert (newest[0].wallet_after, newest[0].bank_after) == (store.users[user_id]["wallet"], store.users[user_id]["bank"])
+    print("OK")
+
+
+if __name__ == "__main__":
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    account_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    asyncio.run(main(records, account_count))
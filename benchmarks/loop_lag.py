@@ -0,0 +1,84 @@
+"""Measure event-loop lag while a burst of messages hits levels storage.
+
+Runs the same read-modify-write that LevelsCog.add_xp does for every message,
+once inline on the event loop and once through the storage I/O executor, while
+a heartbeat task records how late each of its 5 ms ticks fires.
+
+    python benchmarks/loop_lag.py [users] [messages]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+TICK = 0.005
+
+
+async def heartbeat(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - expected)
+
+
+async def message_inline(user_id):
+    backend = storage.get_backend()
+    users = backend.load("levels")
+    users[user_id]["xp"] += 15
+    backend.save("levels", users, [user_id])
+
+
+async def message_executor(user_id):
+    users = await storage.load("levels")
+    users[user_id]["xp"] += 15
+    await storage.save("levels", users, [user_id])
+
+
+async def burst(handler, messages, user_count):
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(TICK * 4)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(str(i % user_count)) for i in range(messages)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+    return elapsed, lags
+
+
+def report(name, elapsed, lags):
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))] if lags_ms else 0
+    print(f"{name:>9}: {elapsed:6.2f}s for the burst, {len(lags_ms):5d} heartbeats, "
+          f"lag mean {statistics.mean(lags_ms or [0]):7.2f} ms, p99 {p99:7.2f} ms, max {max(lags_ms or [0]):7.2f} ms")
+
+
+async def main(user_count, messages):
+    users = {
+        str(i): {"xp": i, "level": 0, "total_messages": i, "last_message": 0}
+        for i in range(user_count)
+    }
+    storage.get_backend().save("levels", users)
+
+    print(f"{user_count} users in levels storage ({storage.get_backend().name}), {messages} messages")
+    report("inline", *await burst(message_inline, messages, user_count))
+    report("executor", *await burst(message_executor, messages, user_count))
+
+
+if __name__ == "__main__":
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        asyncio.run(main(user_count, messages))
@@ -0,0 +1,102 @@
+"""Compare -np latency with sequential and concurrent scrobble count lookups.
+
+Starts a local stand-in for the Last.fm API that answers each method after a fixed
+delay, then runs the -np request pattern through LastFMClient: the recent track,
+followed by track/artist/album.getInfo either one after another (the old -np) or
+together with asyncio.gather (the current -np). The response cache is bypassed and
+the rate limiter opened up, so every run pays for real round trips.
+
+    python benchmarks/np_latency.py [runs] [delay_ms]
+
+Measured with the stand-in answering after d ms:
+
+    d = 50 ms, 50 runs
+      sequential: p50  207.6 ms, p95  229.5 ms
+      concurrent: p50  104.0 ms, p95  113.2 ms
+    d = 150 ms, 50 runs
+      sequential: p50  607.1 ms, p95  613.2 ms
+      concurrent: p50  304.2 ms, p95  310.0 ms
+    d = 300 ms, 20 runs
+      sequential: p50 1207.3 ms, p95 1213.5 ms
+      concurrent: p50  604.4 ms, p95  612.6 ms
+
+That is 4d before and 2d after: the recent track, then the three getInfo calls one
+after another or in parallel.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lastfm_api import LastFMClient  # noqa: E402
+
+INFO_METHODS = ("track.getInfo", "artist.getInfo", "album.getInfo")
+
+
+def make_app(delay):
+    async def handler(request):
+        await asyncio.sleep(delay)
+        method = request.query["method"]
+        if method == "user.getRecentTracks":
+            return web.json_response({"recenttracks": {"track": [{
+                "name": "Song", "artist": {"#text": "Artist"}, "album": {"#text": "Album"},
+                "@attr": {"nowplaying": "true"},
+            }], "@attr": {"total": "1234"}}})
+        return web.json_response({method.split(".")[0]: {"userplaycount": "5"}})
+
+    app = web.Application()
+    app.router.add_get("/2.0/", handler)
+    return app
+
+
+async def np_sequential(api):
+    await api.call("user.getRecentTracks", user="bench", limit=1, use_cache=False)
+    for method in INFO_METHODS:
+        await api.call(method, artist="Artist", username="bench", use_cache=False)
+
+
+async def np_concurrent(api):
+    await api.call("user.getRecentTracks", user="bench", limit=1, use_cache=False)
+    await asyncio.gather(*(api.call(method, artist="Artist", username="bench", use_cache=False)
+                           for method in INFO_METHODS))
+
+
+async def measure(name, handler, api, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await handler(api)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:>10}: p50 {statistics.median(timings):7.1f} ms, p95 {p95:7.1f} ms, max {timings[-1]:7.1f} ms")
+
+
+async def main(runs, delay):
+    runner = web.AppRunner(make_app(delay))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    # A limiter that never throttles, the stand-in server has no rate limit
+    api = LastFMClient("bench", api_url=f"http://127.0.0.1:{port}/2.0/", rate=10000, burst=10000)
+    await api.start()
+    try:
+        print(f"{runs} -np runs, {delay * 1000:.0f} ms per API call")
+        await measure("sequential", np_sequential, api, runs)
+        await measure("concurrent", np_concurrent, api, runs)
+    finally:
+        await api.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    delay_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 150
+    asyncio.run(main(runs, delay_ms / 1000))
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+try:
+    from PIL import Image
+except ImportError:  # charts are unavailable without Pillow
+    Image = None
+
+CHARTS_AVAILABLE = Image is not None
+
+TILE_SIZE = 300
+PLACEHOLDER_COLOR = (43, 45, 49)  # same dark grey as the Last.fm embeds
+
+_chart_executor = None
+
+
+def get_chart_executor():
+    """Process pool for image work, so resizing covers never blocks the event loop"""
+    global _chart_executor
+    if _chart_executor is None:
+        _chart_executor = ProcessPoolExecutor(max_workers=2)
+    return _chart_executor
+
+
+def shutdown_chart_executor():
+    global _chart_executor
+    if _chart_executor is not None:
+        _chart_executor.shutdown(wait=False, cancel_futures=True)
+        _chart_executor = None
+
+
+def render_chart(paths, size, tile=TILE_SIZE):
+    """Compose a size x size grid of cover images into PNG bytes (runs in a worker process).
+
+    ``paths`` are files in row order; None or unreadable files become a plain tile.
+    """
+    chart = Image.new("RGB", (size * tile, size * tile), PLACEHOLDER_COLOR)
+    for i, path in enumerate(paths[:size * size]):
+        if path is None:
+            continue
+        try:
+            with Image.open(path) as cover:
+                cover = cover.convert("RGB").resize((tile, tile))
+        except OSError:
+            continue
+        chart.paste(cover, ((i % size) * tile, (i // size) * tile))
+
+    output = io.BytesIO()
+    chart.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+class CoverCache:
+    """Album covers cached on disk under ``directory``, named by a hash of their URL.
+
+    Missing covers are downloaded concurrently, at most ``concurrency`` at a time.
+    Files are written to a temporary name and renamed, so a half-written cover is
+    never picked up. File checks and writes run on the loop's default executor, not
+    the storage I/O thread, so a chart never queues behind bank journal appends.
+    """
+
+    def __init__(self, directory='data/covers', concurrency=6, timeout=10):
+        self.directory = directory
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.hits = 0
+        self.downloads = 0
+        self.failures = 0
+
+    def path_for(self, url):
+        extension = os.path.splitext(url.split("?")[0])[1].lower()
+        if extension not in (".jpg", ".jpeg", ".png", ".gif", ".webp"):
+            extension = ".img"
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + extension)
+
+    def _write(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def fetch(self, session, url):
+        """Local path of a cover, downloading it first if needed; None if that fails"""
+        if not url:
+            return None
+        path = self.path_for(url)
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, os.path.exists, path):
+            self.hits += 1
+            return path
+
+        async with self.semaphore:
+            try:
+                async with session.get(url, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    data = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.failures += 1
+                print(f"Error downloading cover {url}: {e}")
+                return None
+
+        await loop.run_in_executor(None, self._write, path, data)
+        self.downloads += 1
+        return path
+
+    async def fetch_many(self, session, urls):
+        return await asyncio.gather(*(self.fetch(session, url) for url in urls))
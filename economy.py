@@ -1,10 +1,28 @@
 import discord
 from discord.ext import commands
-import json
-import os
 import random
 import datetime
 import math
+import time
+
+from bank import account_locks, bank_store
+from interest import InterestSchedule
+from profiles import profile_cache
+
+# How ledger reasons are shown in -transactions
+TRANSACTION_LABELS = {
+    "open": "Account Opened",
+    "beg": "Beg",
+    "work": "Work",
+    "gamble": "Gamble",
+    "deposit": "Deposit",
+    "withdraw": "Withdraw",
+    "admin_add": "Added by Admin",
+    "admin_remove": "Removed by Admin",
+    "buyjob": "Job Purchase",
+    "pay": "Payment",
+    "interest": "Interest",
+}
 
 class BalanceLeaderboardView(discord.ui.View):
     def __init__(self, cog, ctx, page, total_pages):
@@ -53,98 +71,7 @@ class BalanceLeaderboardView(discord.ui.View):
             pass
 
     async def update_page(self, new_page: int):
-        # Get all user data from database 
-        users = await self.cog.get_bank_data()
-        
-        # Create list from all users in the database
-        user_list = []
-        
-        # Add all existing database entries
-        for user_id, user_data in users.items():
-            try:
-                # Try to get the member object
-                member = self.ctx.guild.get_member(int(user_id))
-                
-                # Calculate total balance
-                wallet = user_data.get("wallet", 0)
-                bank = user_data.get("bank", 0)
-                total_balance = wallet + bank
-                
-                # Get user data
-                user_entry = {
-                    "id": user_id,
-                    "wallet": wallet,
-                    "bank": bank,
-                    "total": total_balance,
-                    "member": member
-                }
-                user_list.append(user_entry)
-            except Exception as e:
-                # Skip problematic entries
-                continue
-        
-        # Sort by total balance (highest first)
-        user_list.sort(key=lambda x: x["total"], reverse=True)
-        
-        # Paginate results (10 per page)
-        total_pages = max(1, math.ceil(len(user_list) / 10))
-        
-        # Ensure page is within valid range
-        new_page = max(1, min(new_page, total_pages))
-        
-        start_idx = (new_page - 1) * 10
-        end_idx = min(start_idx + 10, len(user_list))
-        
-        # Create embed
-        embed = discord.Embed(
-            title=f"💰 Balance Leaderboard",
-            description=f"Top members ranked by total wealth.",
-            color=discord.Color.gold()
-        )
-        
-        # Add leaderboard entries
-        if not user_list:
-            embed.description = "No users have any money yet!"
-        else:
-            # Get rank emojis for top 3
-            rank_emoji = {0: "🥇", 1: "🥈", 2: "🥉"}
-            
-            for idx, user_data in enumerate(user_list[start_idx:end_idx], start=start_idx + 1):
-                member = user_data["member"]
-                user_id = user_data["id"]
-                position = idx - 1 + start_idx  # Zero-based position
-                
-                # Get appropriate emoji based on rank
-                prefix = rank_emoji.get(position, f"{idx}.")
-                
-                # Get the name and icon url
-                if member:
-                    name = member.name
-                    icon_url = member.avatar.url if member.avatar else member.default_avatar.url
-                else:
-                    # Try to fetch user info from Discord
-                    try:
-                        user = await self.cog.client.fetch_user(int(user_id))
-                        name = user.name
-                        icon_url = user.avatar.url if user.avatar else user.default_avatar.url
-                    except:
-                        # If all else fails, use a generic name
-                        name = f"User-{user_id[-4:]}"
-                        icon_url = None
-                
-                # Create embed field
-                field_name = f"{prefix} {name}"
-                field_value = f"**{user_data['total']} coins**"
-                
-                embed.add_field(name=field_name, value=field_value, inline=False)
-                
-                # Show first-place user as thumbnail
-                if position == 0 and icon_url:
-                    embed.set_thumbnail(url=icon_url)
-        
-        embed.set_footer(text=f"Page {new_page}/{total_pages} • Requested by {self.ctx.author.name}", 
-                         icon_url=self.ctx.author.avatar.url if self.ctx.author.avatar else self.ctx.author.default_avatar.url)
-        embed.timestamp = datetime.datetime.utcnow()
+        embed, new_page, total_pages = await self.cog.build_balance_leaderboard(self.ctx, new_page)
         
         # Create new view with updated page
         new_view = BalanceLeaderboardView(self.cog, self.ctx, new_page, total_pages)
@@ -164,6 +91,15 @@ class BalanceLeaderboardView(discord.ui.View):
 class EconomyCog(commands.Cog):
     def __init__(self, client):
         self.client = client
+        # Daily interest on bank balances, rates and cap are in interest.py
+        self.interest_schedule = InterestSchedule(bank_store)
+        
+    async def cog_load(self):
+        # Pays any periods missed while the bot was offline
+        await self.interest_schedule.start()
+        
+    async def cog_unload(self):
+        self.interest_schedule.close()
         
     @commands.command()
     async def balance(self, ctx):
@@ -177,6 +113,7 @@ class EconomyCog(commands.Cog):
         em = discord.Embed(title=f"{ctx.author.name}'s balance", color=discord.Color.from_rgb(255, 255, 255))
         em.add_field(name="Wallet balance", value=wallet_amt)
         em.add_field(name="Bank balance", value=bank_amt)
+        em.add_field(name="Rank", value=f"#{bank_store.ranking.rank(ctx.author.id)} of {len(bank_store.ranking)}")
         await ctx.send(embed=em)
 
     @commands.command()
@@ -210,7 +147,9 @@ class EconomyCog(commands.Cog):
         
         embed.set_thumbnail(url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
         
-        new_balance = users[str(ctx.author.id)]["wallet"] + earnings
+        # Pay out before anything is sent, so the shown balance is the stored one
+        async with account_locks.hold(ctx.author.id):
+            new_balance = bank_store.apply(ctx.author.id, wallet=earnings, reason="beg")["wallet"]
         embed.add_field(
             name="New Wallet Balance", 
             value=f"{new_balance} coins",
@@ -221,11 +160,6 @@ class EconomyCog(commands.Cog):
         embed.timestamp = datetime.datetime.utcnow()
         
         await ctx.send(embed=embed)
-        
-        users[str(ctx.author.id)]["wallet"] += earnings
-        
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
 
     @beg.error  # error handling for -beg
     async def beg_error(self, ctx, error):
@@ -258,43 +192,28 @@ class EconomyCog(commands.Cog):
             embed.set_footer(text="Please report this to the admins")
             await ctx.send(embed=embed)
     
-    async def open_account(self, user):
-        users = await self.get_bank_data()
-
-        if str(user.id) in users:
-            return False
-        else:
-            users[str(user.id)] = {}
-            users[str(user.id)]["wallet"] = 50  # starting balance
-            users[str(user.id)]["bank"] = 0
+    def parse_amount(self, amount, available):
+        """Turn a number, a percentage like "50%" or "all" into coins, raises ValueError with a message"""
+        if amount.lower() == "all":
+            return available
+        if "%" in amount:
+            try:
+                percentage = int(amount.replace("%", ""))
+                if percentage <= 0 or percentage > 100:
+                    raise ValueError
+            except ValueError:
+                raise ValueError("Please enter a valid percentage between 1% and 100%")
+            return int(available * (percentage / 100))
+        try:
+            return int(amount)
+        except ValueError:
+            raise ValueError("Please enter a valid number, percentage, or 'all'")
 
-        with open('data/bank.json', 'w') as f:  # opens account for new user
-            json.dump(users, f)
-        return True
+    async def open_account(self, user):
+        return bank_store.open_account(user.id, wallet=50)  # starting balance
     
     async def get_bank_data(self):
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        
-        if not os.path.exists('data/bank.json'):
-            with open('data/bank.json', 'w') as f:
-                json.dump({}, f)
-
-        with open('data/bank.json', 'r') as f:
-            content = f.read().strip()
-            if not content:
-                users = {}
-            else:
-                try:
-                    users = json.loads(content)
-                except json.JSONDecodeError:
-                    users = {}
-            
-        if not content:
-            with open('data/bank.json', 'w') as f:
-                json.dump(users, f)
-                
-        return users
+        return bank_store.get_bank_data()
 
     @commands.command()
     async def withdraw(self, ctx, amount=None):
@@ -312,33 +231,16 @@ class EconomyCog(commands.Cog):
             return
             
         # Handle percentage-based withdrawals
-        if amount.lower() == "all":
-            amount = users[str(user.id)]["bank"]
-        elif "%" in amount:
-            try:
-                percentage = int(amount.replace("%", ""))
-                if percentage <= 0 or percentage > 100:
-                    raise ValueError
-                amount = int(users[str(user.id)]["bank"] * (percentage / 100))
-            except ValueError:
-                embed = discord.Embed(
-                    title="Error",
-                    description="Please enter a valid percentage between 1% and 100%",
-                    color=discord.Color.red()
-                )
-                await ctx.send(embed=embed)
-                return
-        else:
-            try:
-                amount = int(amount)
-            except ValueError:
-                embed = discord.Embed(
-                    title="Error",
-                    description="Please enter a valid number, percentage, or 'all'",
-                    color=discord.Color.red()
-                )
-                await ctx.send(embed=embed)
-                return
+        try:
+            amount = self.parse_amount(amount, users[str(user.id)]["bank"])
+        except ValueError as e:
+            embed = discord.Embed(
+                title="Error",
+                description=str(e),
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
         
         if amount <= 0:
             embed = discord.Embed(
@@ -349,7 +251,14 @@ class EconomyCog(commands.Cog):
             await ctx.send(embed=embed)
             return
             
-        if amount > users[str(user.id)]["bank"]:
+        # Check and update under the account's lock, so nothing changes the bank in between
+        async with account_locks.hold(user.id):
+            enough = amount <= users[str(user.id)]["bank"]
+            if enough:
+                account = bank_store.apply(user.id, wallet=amount, bank=-amount, reason="withdraw")
+                wallet_amt, bank_amt = account["wallet"], account["bank"]
+        
+        if not enough:
             embed = discord.Embed(
                 title="Error",
                 description="You don't have that much money in your bank!",
@@ -358,14 +267,6 @@ class EconomyCog(commands.Cog):
             await ctx.send(embed=embed)
             return
             
-        # Update balances
-        users[str(user.id)]["bank"] -= amount
-        users[str(user.id)]["wallet"] += amount
-        
-        # Save updated data
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
-            
         # Create and send embed
         embed = discord.Embed(
             title="Withdrawal Successful",
@@ -375,13 +276,13 @@ class EconomyCog(commands.Cog):
         
         embed.add_field(
             name="Wallet Balance", 
-            value=f"{users[str(user.id)]['wallet']} coins",
+            value=f"{wallet_amt} coins",
             inline=True
         )
         
         embed.add_field(
             name="Bank Balance", 
-            value=f"{users[str(user.id)]['bank']} coins",
+            value=f"{bank_amt} coins",
             inline=True
         )
         
@@ -406,33 +307,16 @@ class EconomyCog(commands.Cog):
             return
             
         # Handle percentage-based deposits
-        if amount.lower() == "all":
-            amount = users[str(user.id)]["wallet"]
-        elif "%" in amount:
-            try:
-                percentage = int(amount.replace("%", ""))
-                if percentage <= 0 or percentage > 100:
-                    raise ValueError
-                amount = int(users[str(user.id)]["wallet"] * (percentage / 100))
-            except ValueError:
-                embed = discord.Embed(
-                    title="Error",
-                    description="Please enter a valid percentage between 1% and 100%",
-                    color=discord.Color.red()
-                )
-                await ctx.send(embed=embed)
-                return
-        else:
-            try:
-                amount = int(amount)
-            except ValueError:
-                embed = discord.Embed(
-                    title="Error",
-                    description="Please enter a valid number, percentage, or 'all'",
-                    color=discord.Color.red()
-                )
-                await ctx.send(embed=embed)
-                return
+        try:
+            amount = self.parse_amount(amount, users[str(user.id)]["wallet"])
+        except ValueError as e:
+            embed = discord.Embed(
+                title="Error",
+                description=str(e),
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
         
         if amount <= 0:
             embed = discord.Embed(
@@ -443,7 +327,14 @@ class EconomyCog(commands.Cog):
             await ctx.send(embed=embed)
             return
             
-        if amount > users[str(user.id)]["wallet"]:
+        # Check and update under the account's lock, so nothing changes the wallet in between
+        async with account_locks.hold(user.id):
+            enough = amount <= users[str(user.id)]["wallet"]
+            if enough:
+                account = bank_store.apply(user.id, wallet=-amount, bank=amount, reason="deposit")
+                wallet_amt, bank_amt = account["wallet"], account["bank"]
+        
+        if not enough:
             embed = discord.Embed(
                 title="Error",
                 description="You don't have that much money in your wallet!",
@@ -451,14 +342,6 @@ class EconomyCog(commands.Cog):
             )
             await ctx.send(embed=embed)
             return
-                    
-        # Update balances
-        users[str(user.id)]["wallet"] -= amount
-        users[str(user.id)]["bank"] += amount
-        
-        # Save updated data
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
             
         # Create and send embed
         embed = discord.Embed(
@@ -469,13 +352,13 @@ class EconomyCog(commands.Cog):
         
         embed.add_field(
             name="Wallet Balance", 
-            value=f"{users[str(user.id)]['wallet']} coins",
+            value=f"{wallet_amt} coins",
             inline=True
         )
         
         embed.add_field(
             name="Bank Balance", 
-            value=f"{users[str(user.id)]['bank']} coins",
+            value=f"{bank_amt} coins",
             inline=True
         )
         
@@ -484,51 +367,232 @@ class EconomyCog(commands.Cog):
         
         await ctx.send(embed=embed)
 
+    @commands.command()
+    async def pay(self, ctx, member: discord.Member = None, amount=None):
+        """Give coins from your wallet to another member"""
+        if member is None or amount is None:
+            embed = discord.Embed(
+                title="Error",
+                description="Usage: `-pay @user <amount|%|all>`",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        if member.id == ctx.author.id or member.bot:
+            embed = discord.Embed(
+                title="Error",
+                description="You can only pay other members!",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        await self.open_account(ctx.author)
+        await self.open_account(member)
+        users = await self.get_bank_data()
+        sender_id, receiver_id = str(ctx.author.id), str(member.id)
+        
+        # Both accounts are locked (in a fixed order) from reading the balance to the commit
+        error = None
+        async with account_locks.hold(sender_id, receiver_id):
+            wallet_amt = users[sender_id]["wallet"]
+            try:
+                amount = self.parse_amount(amount, wallet_amt)
+            except ValueError as e:
+                error = str(e)
+            if error is None and amount <= 0:
+                error = "Amount must be positive!"
+            if error is None and amount > wallet_amt:
+                error = "You don't have that much money in your wallet!"
+            if error is None:
+                sender, receiver = bank_store.transfer(sender_id, receiver_id, amount)
+        
+        if error:
+            embed = discord.Embed(
+                title="Error",
+                description=error,
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        embed = discord.Embed(
+            title="Payment Sent",
+            description=f"You paid **{amount} coins** to {member.mention}!",
+            color=discord.Color.green()
+        )
+        
+        embed.add_field(
+            name="Your Wallet", 
+            value=f"{sender['wallet']} coins",
+            inline=True
+        )
+        
+        embed.add_field(
+            name=f"{member.name}'s Wallet", 
+            value=f"{receiver['wallet']} coins",
+            inline=True
+        )
+        
+        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+        embed.timestamp = datetime.datetime.utcnow()
+        
+        await ctx.send(embed=embed)
+
+    @commands.command(aliases=["eco"])
+    async def economy(self, ctx):
+        """Show economy-wide statistics"""
+        # Maintained by the bank on every change, nothing is counted here
+        stats = bank_store.stats
+        sketch = stats.sketch
+        supply = stats.supply
+        
+        embed = discord.Embed(
+            title="📊 Economy",
+            description=f"**{supply:,} coins** across {stats.accounts:,} accounts.",
+            color=discord.Color.gold()
+        )
+        
+        if supply > 0:
+            split = f"Wallets: **{stats.wallet:,}** ({stats.wallet / supply:.0%})\nBanks: **{stats.bank:,}** ({stats.bank / supply:.0%})"
+        else:
+            split = f"Wallets: **{stats.wallet:,}**\nBanks: **{stats.bank:,}**"
+        embed.add_field(name="Supply", value=split, inline=True)
+        
+        if stats.accounts:
+            embed.add_field(
+                name="Balances",
+                value=(
+                    f"Median: **{sketch.quantile(0.5):,}**\n"
+                    f"Top 10% from: **{sketch.quantile(0.9):,}**\n"
+                    f"Top 1% from: **{sketch.quantile(0.99):,}**"
+                ),
+                inline=True
+            )
+            embed.add_field(name="Gini Coefficient", value=f"**{sketch.gini():.2f}**", inline=True)
+        
+        now = time.time()
+        today = stats.inflow_since(now, days=1)
+        week = stats.inflow_since(now, days=7)
+        inflow = [
+            f"{TRANSACTION_LABELS[reason]}: **{today[reason]:+,}** today, {week[reason]:+,} this week"
+            for reason in today
+        ]
+        embed.add_field(name="Coins Created", value="\n".join(inflow), inline=False)
+        
+        embed.set_footer(text=f"Balances within ~{stats.alpha:.0%} • Requested by {ctx.author.name}", 
+                         icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+        embed.timestamp = datetime.datetime.utcnow()
+        
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def interest(self, ctx):
+        """Show the bank interest rates and your next payout"""
+        await self.open_account(ctx.author)
+        users = await self.get_bank_data()
+        bank_amt = users[str(ctx.author.id)]["bank"]
+        schedule = self.interest_schedule
+        
+        embed = discord.Embed(
+            title="🏦 Bank Interest",
+            description="Coins in your bank earn interest every day. Each rate applies to the part of your balance in its bracket.",
+            color=discord.Color.gold()
+        )
+        
+        brackets = []
+        for i, (lower, rate) in enumerate(schedule.brackets):
+            if i + 1 < len(schedule.brackets):
+                brackets.append(f"{lower:,} - {schedule.brackets[i + 1][0]:,} coins: **{rate:.2%}**")
+            else:
+                brackets.append(f"{lower:,}+ coins: **{rate:.2%}**")
+        if schedule.cap is not None:
+            brackets.append(f"Capped at **{schedule.cap:,} coins** per day")
+        embed.add_field(name="Daily Rates", value="\n".join(brackets), inline=False)
+        
+        embed.add_field(
+            name="Your Interest",
+            value=f"**{schedule.preview(bank_amt)} coins** on {bank_amt} in the bank",
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Next Payout",
+            value=f"<t:{schedule.next_payout()}:R>",
+            inline=True
+        )
+        
+        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+        embed.timestamp = datetime.datetime.utcnow()
+        
+        await ctx.send(embed=embed)
+
+    @commands.command(aliases=["txs"])
+    async def transactions(self, ctx, page: int = 1):
+        """Show your transaction history, newest first"""
+        ledger = bank_store.ledger
+        
+        # Paginate results (10 per page)
+        total_pages = max(1, math.ceil(ledger.count_for(ctx.author.id) / 10))
+        
+        # Ensure page is within valid range
+        page = max(1, min(page, total_pages))
+        
+        # Only this page's records are read from the ledger
+        history = await ledger.history(ctx.author.id, page)
+        
+        embed = discord.Embed(
+            title="📜 Transaction History",
+            color=discord.Color.blue()
+        )
+        
+        if not history:
+            embed.description = "You don't have any transactions yet!"
+        else:
+            lines = []
+            for transaction in history:
+                changes = []
+                if transaction.wallet:
+                    changes.append(f"{transaction.wallet:+} wallet")
+                if transaction.bank:
+                    changes.append(f"{transaction.bank:+} bank")
+                label = TRANSACTION_LABELS.get(transaction.reason, transaction.reason.title())
+                lines.append(
+                    f"**{label}** <t:{transaction.time}:R>\n"
+                    f"{', '.join(changes) or 'no change'} → {transaction.wallet_after} wallet, {transaction.bank_after} bank"
+                )
+            embed.description = "\n".join(lines)
+        
+        embed.set_footer(text=f"Page {page}/{total_pages} • Requested by {ctx.author.name}", 
+                         icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+        embed.timestamp = datetime.datetime.utcnow()
+        
+        await ctx.send(embed=embed)
+
     @commands.command(aliases=["baltop"])
     async def balancetop(self, ctx, page: int = 1):
         """Show the server's balance leaderboard"""
-        # Get all user data from the database file directly
-        users = await self.get_bank_data()
+        embed, page, total_pages = await self.build_balance_leaderboard(ctx, page)
         
-        # Create list from all users in the database
-        user_list = []
+        # Create view with pagination buttons
+        view = BalanceLeaderboardView(self, ctx, page, total_pages)
         
-        # First, add all existing database entries
-        for user_id, user_data in users.items():
-            try:
-                # Try to get the member object, fetch from Discord if needed
-                member = ctx.guild.get_member(int(user_id))
-                
-                # Calculate total balance
-                wallet = user_data.get("wallet", 0)
-                bank = user_data.get("bank", 0)
-                total_balance = wallet + bank
-                
-                # Get user data
-                user_entry = {
-                    "id": user_id,
-                    "wallet": wallet,
-                    "bank": bank,
-                    "total": total_balance,
-                    "member": member
-                }
-                user_list.append(user_entry)
-            except Exception as e:
-                # Skip problematic entries
-                continue
-        
-        # Now sort and display
-        # Sort by total balance (highest first)
-        user_list.sort(key=lambda x: x["total"], reverse=True)
+        # Send embed with view
+        view.message = await ctx.send(embed=embed, view=view)
+
+    async def build_balance_leaderboard(self, ctx, page):
+        """Build one page of the balance leaderboard, returns (embed, page, total_pages)"""
+        # Accounts are kept sorted by total balance, so only this page is looked at
+        ranking = bank_store.ranking
         
         # Paginate results (10 per page)
-        total_pages = max(1, math.ceil(len(user_list) / 10))
+        total_pages = max(1, math.ceil(len(ranking) / 10))
         
         # Ensure page is within valid range
         page = max(1, min(page, total_pages))
         
         start_idx = (page - 1) * 10
-        end_idx = min(start_idx + 10, len(user_list))
         
         # Create embed
         embed = discord.Embed(
@@ -538,38 +602,26 @@ class EconomyCog(commands.Cog):
         )
         
         # Add leaderboard entries
-        if not user_list:
+        if not len(ranking):
             embed.description = "No users have any money yet!"
         else:
             # Get rank emojis for top 3
             rank_emoji = {0: "🥇", 1: "🥈", 2: "🥉"}
             
-            for idx, user_data in enumerate(user_list[start_idx:end_idx], start=start_idx + 1):
-                member = user_data["member"]
-                user_id = user_data["id"]
-                position = idx - 1 + start_idx  # Zero-based position
-                
-                # Get appropriate emoji based on rank
-                prefix = rank_emoji.get(position, f"{idx}.")
+            rows = ranking.page(page)
+            # Resolve every name on the page at once instead of one fetch per row
+            profiles = await profile_cache.resolve_many(self.client, ctx.guild, [user_id for user_id, _ in rows])
+            
+            for position, (user_id, total) in enumerate(rows, start=start_idx):
+                # Get appropriate emoji based on rank (position is zero-based)
+                prefix = rank_emoji.get(position, f"{position + 1}.")
                 
                 # Get the name and icon url
-                if member:
-                    name = member.name
-                    icon_url = member.avatar.url if member.avatar else member.default_avatar.url
-                else:
-                    # Try to fetch user info from Discord
-                    try:
-                        user = await self.client.fetch_user(int(user_id))
-                        name = user.name
-                        icon_url = user.avatar.url if user.avatar else user.default_avatar.url
-                    except:
-                        # If all else fails, use a generic name
-                        name = f"User-{user_id[-4:]}"
-                        icon_url = None
+                name, icon_url = profiles[user_id]
                 
                 # Create embed field
                 field_name = f"{prefix} {name}"
-                field_value = f"**{user_data['total']} coins**"
+                field_value = f"**{total} coins**"
                 
                 embed.add_field(name=field_name, value=field_value, inline=False)
                 
@@ -581,11 +633,7 @@ class EconomyCog(commands.Cog):
                          icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
         embed.timestamp = datetime.datetime.utcnow()
         
-        # Create view with pagination buttons
-        view = BalanceLeaderboardView(self, ctx, page, total_pages)
-        
-        # Send embed with view
-        view.message = await ctx.send(embed=embed, view=view)
+        return embed, page, total_pages
 
     async def add_balance(self, user_id, amount):
         """Add balance to a user's account (admin command)"""
@@ -595,19 +643,13 @@ class EconomyCog(commands.Cog):
         user_id = str(user_id)
         
         # Create account if user doesn't exist
-        if user_id not in users:
-            users[user_id] = {}
-            users[user_id]["wallet"] = 0
-            users[user_id]["bank"] = 0
+        bank_store.open_account(user_id, wallet=0)
         
         # Add amount to wallet
-        users[user_id]["wallet"] += amount
-        
-        # Save updated data
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
+        async with account_locks.hold(user_id):
+            account = bank_store.apply(user_id, wallet=amount, reason="admin_add")
             
-        return users[user_id]["wallet"]
+        return account["wallet"]
     
     async def remove_balance(self, user_id, amount):
         """Remove balance from a user's account (admin command)"""
@@ -616,30 +658,25 @@ class EconomyCog(commands.Cog):
         # Convert user_id to string for consistency
         user_id = str(user_id)
         
-        # Create account if user doesn't exist
+        # Can't remove from an account that doesn't exist
         if user_id not in users:
-            users[user_id] = {}
-            users[user_id]["wallet"] = 0
-            users[user_id]["bank"] = 0
-            return False  # Can't remove from empty account
-        
-        # Check if user has enough in wallet
-        if users[user_id]["wallet"] >= amount:
-            users[user_id]["wallet"] -= amount
-        # If not enough in wallet, check combined balance
-        elif (users[user_id]["wallet"] + users[user_id]["bank"]) >= amount:
-            # Take what we can from wallet
-            remainder = amount - users[user_id]["wallet"]
-            users[user_id]["wallet"] = 0
-            # Take the rest from bank
-            users[user_id]["bank"] -= remainder
-        else:
-            # Not enough money, set to zero
-            users[user_id]["wallet"] = 0
-            users[user_id]["bank"] = 0
+            return False
         
-        # Save updated data
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
+        async with account_locks.hold(user_id):
+            wallet = users[user_id]["wallet"]
+            bank = users[user_id]["bank"]
+            
+            # Check if user has enough in wallet
+            if wallet >= amount:
+                wallet_change, bank_change = -amount, 0
+            # If not enough in wallet, check combined balance
+            elif (wallet + bank) >= amount:
+                # Take what we can from wallet, the rest from bank
+                wallet_change, bank_change = -wallet, -(amount - wallet)
+            else:
+                # Not enough money, set to zero
+                wallet_change, bank_change = -wallet, -bank
+            
+            bank_store.apply(user_id, wallet=wallet_change, bank=bank_change, reason="admin_remove")
             
         return True
\ No newline at end of file
@@ -0,0 +1,171 @@
+import math
+
+DAY = 24 * 60 * 60
+INFLOW_REASONS = ("beg", "work", "gamble", "interest")  # changes that create (or destroy) coins
+INFLOW_DAYS = 7
+
+
+class QuantileSketch:
+    """Histogram of integer values in logarithmic buckets, with add and remove.
+
+    Bucket i + 1 holds values in (gamma^(i-1), gamma^i], so the point 2 gamma^i / (gamma + 1)
+    is within ``alpha`` (relative) of every value in it. Values <= 0 share bucket 0.
+    Each bucket also keeps the exact sum of its values. Quantiles and the Gini coefficient walk the buckets, whose
+    number grows with the log of the largest value rather than with the count.
+    """
+
+    def __init__(self, alpha=0.01):
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.counts = {}  # bucket -> values in it
+        self.sums = {}  # bucket -> sum of those values
+        self.count = 0
+
+    def bucket(self, value):
+        if value <= 0:
+            return 0
+        return math.ceil(math.log(value) / self.log_gamma) + 1
+
+    def add(self, value):
+        bucket = self.bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.sums[bucket] = self.sums.get(bucket, 0) + value
+        self.count += 1
+
+    def remove(self, value):
+        bucket = self.bucket(value)
+        count = self.counts.get(bucket, 0)
+        if count <= 1:
+            self.counts.pop(bucket, None)
+            self.sums.pop(bucket, None)
+        else:
+            self.counts[bucket] = count - 1
+            self.sums[bucket] -= value
+        self.count -= 1
+
+    def move(self, old, new):
+        """Replace one ``old`` value with ``new``"""
+        old_bucket = self.bucket(old)
+        new_bucket = self.bucket(new)
+        if old_bucket == new_bucket:
+            self.sums[old_bucket] += new - old
+            return
+        self.remove(old)
+        self.add(new)
+
+    def buckets(self):
+        """(count, sum) per bucket, smallest values first"""
+        return [(self.counts[bucket], self.sums[bucket]) for bucket in sorted(self.counts)]
+
+    def quantile(self, q):
+        """Value at quantile q (0 to 1) within ``alpha``, rounded to a whole coin; None if empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                if bucket == 0:
+                    return 0
+                return round(2 * self.gamma ** (bucket - 1) / (self.gamma + 1))
+        return None
+
+    def gini(self):
+        """Approximate Gini coefficient, treating the values in a bucket as equal"""
+        buckets = self.buckets()
+        total = sum(bucket_sum for _, bucket_sum in buckets)
+        if not self.count or total <= 0:
+            return 0.0
+        # 1 - sum over groups of population share * (cumulative share before + after)
+        area = 0.0
+        cumulative = 0.0
+        for count, bucket_sum in buckets:
+            share = bucket_sum / total
+            area += count / self.count * (2 * cumulative + share)
+            cumulative += share
+        return 1 - area
+
+
+class EconomyStats:
+    """Economy-wide aggregates, kept up to date by BankStore on every balance change.
+
+    Supply is a pair of running sums and the distribution of account totals (wallet +
+    bank) lives in a QuantileSketch, so every figure is available without looking at
+    the accounts. Coins created per day by begging, work, gambling and interest are
+    kept for the last ``INFLOW_DAYS`` days.
+    """
+
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.wallet = 0
+        self.bank = 0
+        self.sketch = QuantileSketch(alpha)
+        self.inflow = {}  # day number -> {reason: coins}
+
+    @property
+    def accounts(self):
+        return self.sketch.count
+
+    @property
+    def supply(self):
+        return self.wallet + self.bank
+
+    def rebuild(self, accounts, transactions=()):
+        """Start over from every (wallet, bank) pair and the recent ledger transactions"""
+        self.wallet = 0
+        self.bank = 0
+        self.sketch = QuantileSketch(self.alpha)
+        self.inflow = {}
+        for wallet, bank in accounts:
+            self.wallet += wallet
+            self.bank += bank
+            self.sketch.add(wallet + bank)
+        for transaction in transactions:
+            self.count_inflow(transaction.reason, transaction.wallet + transaction.bank, transaction.time)
+
+    def change(self, old_total, wallet, bank, reason, now):
+        """Account for one change; ``old_total`` is None for a new account"""
+        if old_total is None:
+            self.sketch.add(wallet + bank)
+        else:
+            self.sketch.move(old_total, old_total + wallet + bank)
+        self.wallet += wallet
+        self.bank += bank
+        self.count_inflow(reason, wallet + bank, now)
+
+    def change_many(self, changes, reason, now):
+        """Account for (old_total, wallet, bank) changes made together with one reason"""
+        wallet_sum = 0
+        bank_sum = 0
+        for old_total, wallet, bank in changes:
+            if old_total is None:
+                self.sketch.add(wallet + bank)
+            else:
+                self.sketch.move(old_total, old_total + wallet + bank)
+            wallet_sum += wallet
+            bank_sum += bank
+        self.wallet += wallet_sum
+        self.bank += bank_sum
+        self.count_inflow(reason, wallet_sum + bank_sum, now)
+
+    def count_inflow(self, reason, amount, now):
+        if reason not in INFLOW_REASONS:
+            return
+        day = int(now // DAY)
+        if day not in self.inflow:
+            self.inflow[day] = {}
+            # Forget days that have dropped out of the window
+            for old in [d for d in self.inflow if d <= day - INFLOW_DAYS]:
+                del self.inflow[old]
+        self.inflow[day][reason] = self.inflow[day].get(reason, 0) + amount
+
+    def inflow_since(self, now, days=1):
+        """Coins created per reason over the last ``days`` days (today counts as one)"""
+        today = int(now // DAY)
+        totals = dict.fromkeys(INFLOW_REASONS, 0)
+        for day, reasons in self.inflow.items():
+            if today - days < day <= today:
+                for reason, amount in reasons.items():
+                    totals[reason] += amount
+        return totals
@@ -1,51 +1,19 @@
 import discord
 from discord.ext import commands
 import random
-import json
-import os
 import datetime
 
+from bank import account_locks, bank_store
+
 class GamblingCog(commands.Cog):
     def __init__(self, client):
         self.client = client
     
     async def get_bank_data(self):
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        
-        if not os.path.exists('data/bank.json'):
-            with open('data/bank.json', 'w') as f:
-                json.dump({}, f)
-
-        with open('data/bank.json', 'r') as f:
-            content = f.read().strip()
-            if not content:
-                users = {}
-            else:
-                try:
-                    users = json.loads(content)
-                except json.JSONDecodeError:
-                    users = {}
-            
-        if not content:
-            with open('data/bank.json', 'w') as f:
-                json.dump(users, f)
-                
-        return users
+        return bank_store.get_bank_data()
     
     async def open_account(self, user):
-        users = await self.get_bank_data()
-
-        if str(user.id) in users:
-            return False
-        else:
-            users[str(user.id)] = {}
-            users[str(user.id)]["wallet"] = 0
-            users[str(user.id)]["bank"] = 0
-
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
-        return True
+        return bank_store.open_account(user.id, wallet=0)
     
     @commands.command()
     async def gamble(self, ctx, amount=None):
@@ -90,8 +58,6 @@ class GamblingCog(commands.Cog):
                 await ctx.send(embed=embed)
                 return
         
-        wallet_amt = users[str(user.id)]["wallet"]
-        
         if amount <= 0:
             embed = discord.Embed(
                 title="Error",
@@ -100,8 +66,18 @@ class GamblingCog(commands.Cog):
             )
             await ctx.send(embed=embed)
             return
+        
+        # Coin flip - heads or tails
+        result = "heads" if random.randint(1, 2) == 1 else "tails"
+        win = result == "heads"  # Win on heads, lose on tails
+        
+        # Check the stake and settle it under the account's lock
+        async with account_locks.hold(user.id):
+            enough = amount <= users[str(user.id)]["wallet"]
+            if enough:
+                new_balance = bank_store.apply(user.id, wallet=amount if win else -amount, reason="gamble")["wallet"]
             
-        if amount > wallet_amt:
+        if not enough:
             embed = discord.Embed(
                 title="Error",
                 description="You don't have enough coins!",
@@ -110,28 +86,15 @@ class GamblingCog(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        # Coin flip - heads or tails
-        result = "heads" if random.randint(1, 2) == 1 else "tails"
-        win = result == "heads"  # Win on heads, lose on tails
-        
-        # Update balance
         if win:
-            users[str(user.id)]["wallet"] += amount
-            new_balance = users[str(user.id)]["wallet"]
             color = discord.Color.green()
             title = "You Won!"
             description = f"The coin landed on **{result}**! You won **{amount} coins**!"
         else:
-            users[str(user.id)]["wallet"] -= amount
-            new_balance = users[str(user.id)]["wallet"]
             color = discord.Color.red()
             title = "You Lost!"
             description = f"The coin landed on **{result}**! You lost **{amount} coins**!"
         
-        # Save updated data
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
-        
         # Create and send embed
         embed = discord.Embed(
             title=title,
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from array import array
+
+log = logging.getLogger(__name__)
+
+PERIOD = 24 * 60 * 60  # interest is paid once per UTC day
+
+# Marginal daily rates: each rate applies to the part of a bank balance from its
+# threshold up to the next one, like tax brackets
+BRACKETS = (
+    (0, 0.01),
+    (10_000, 0.005),
+    (100_000, 0.001),
+)
+DAILY_CAP = 2_500  # most interest one account earns per period, None for no cap
+
+
+def _bounds(brackets):
+    """(lower, upper, rate) per bracket, the last one open-ended (upper None)"""
+    return [
+        (lower, brackets[i + 1][0] if i + 1 < len(brackets) else None, rate)
+        for i, (lower, rate) in enumerate(brackets)
+    ]
+
+
+def _interest(balance, bounds):
+    interest = 0
+    for lower, upper, rate in bounds:
+        if balance <= lower:
+            break
+        interest += ((balance if upper is None else min(balance, upper)) - lower) * rate
+    return int(interest)
+
+
+def period_interest(balance, brackets=BRACKETS, cap=DAILY_CAP):
+    """Interest on one balance for one period, rounded down"""
+    interest = _interest(balance, _bounds(brackets))
+    return interest if cap is None else min(interest, cap)
+
+
+def accrue(balances, periods=1, brackets=BRACKETS, cap=DAILY_CAP):
+    """Bank balances after compounding ``periods`` payouts, as a new ``array('q')``.
+
+    One pass over the array. Interest only grows with the balance, so an account that
+    earns nothing stays at nothing and one that hits the cap stays capped; both finish
+    in O(1) however many periods are being caught up.
+    """
+    bounds = _bounds(brackets)
+
+    def grow(balance):
+        for period in range(periods):
+            interest = _interest(balance, bounds)
+            if interest <= 0:
+                break
+            if cap is not None and interest >= cap:
+                balance += cap * (periods - period)
+                break
+            balance += interest
+        return balance
+
+    return array('q', map(grow, balances))
+
+
+class InterestSchedule:
+    """Pays interest on bank balances once per period, catching up missed periods.
+
+    The last paid period is a BankStore mark, written in the same journal entry as the
+    payout, so a crash keeps both or neither. All balances change together in one
+    ``BankStore.apply_many`` commit. The compounding itself runs in a worker thread.
+    """
+
+    def __init__(self, store, brackets=BRACKETS, cap=DAILY_CAP, period=PERIOD):
+        self.store = store
+        self.brackets = brackets
+        self.cap = cap
+        self.period = period
+        self.last_period = None
+        self.paid = 0  # coins paid since startup
+        self._task = None
+        self._lock = asyncio.Lock()  # one payout at a time
+
+    def current_period(self, now=None):
+        return int((time.time() if now is None else now) // self.period)
+
+    def next_payout(self):
+        """Unix time of the next payout"""
+        return (self.last_period + 1) * self.period
+
+    def preview(self, balance):
+        """Interest a bank balance would earn at the next payout"""
+        return period_interest(balance, self.brackets, self.cap)
+
+    def load(self):
+        self.store.get_bank_data()
+        period = self.store.marks.get("interest")
+        if period is None:
+            # Fresh install: start counting now instead of paying for the past
+            period = self.current_period()
+            self.store.apply_many([], reason="interest", marks={"interest": period})
+        self.last_period = period
+
+    async def accrue(self, now=None):
+        """Pay every period due by ``now``, returns the coins paid"""
+        async with self._lock:
+            current = self.current_period(now)
+            periods = current - self.last_period
+            if periods <= 0:
+                return 0
+
+            users = self.store.get_bank_data()
+            user_ids = [user_id for user_id, account in users.items() if account.get("bank", 0) > 0]
+            balances = array('q', (users[user_id]["bank"] for user_id in user_ids))
+            # Interest is paid as deltas, so changes made while this runs are kept
+            new_balances = await asyncio.get_running_loop().run_in_executor(
+                None, accrue, balances, periods, self.brackets, self.cap
+            )
+
+            changes = [
+                (user_id, 0, after - before)
+                for user_id, before, after in zip(user_ids, balances, new_balances)
+                if after != before
+            ]
+            self.store.apply_many(changes, reason="interest", marks={"interest": current})
+            self.last_period = current
+            paid = sum(change[2] for change in changes)
+            self.paid += paid
+            log.info("Paid %d coins of interest to %d accounts for %d period(s)", paid, len(changes), periods)
+            return paid
+
+    async def start(self):
+        """Catch up on missed periods and start paying on schedule"""
+        if self.last_period is None:
+            self.load()
+        await self.accrue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            # At least a minute, so a failing payout isn't retried in a tight loop
+            await asyncio.sleep(max(60, self.next_payout() - time.time() + 1))
+            try:
+                await self.accrue()
+            except Exception:
+                log.exception("Error paying interest")
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
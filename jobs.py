@@ -1,11 +1,12 @@
 import discord
 from discord.ext import commands
-import json
-import os
 import random
 import datetime
 from typing import Dict, List
 
+from bank import account_locks, bank_store
+import storage
+
 class JobMarketView(discord.ui.View):
     def __init__(self, cog, ctx, page, total_pages):
         super().__init__(timeout=60)
@@ -117,7 +118,6 @@ class JobMarketView(discord.ui.View):
 class JobMarketCog(commands.Cog):
     def __init__(self, client):
         self.client = client
-        self.jobs_file = 'data/jobs.json'
         self.jobs: Dict[str, Dict] = {
             "McDonalds-Employee": {"base_pay": 75, "bonus_chance": 0.2, "bonus_amount": 50, "cost": 0},
             "Artist": {"base_pay": 300, "bonus_chance": 0.25, "bonus_amount": 250, "cost": 1000},
@@ -145,74 +145,41 @@ class JobMarketCog(commands.Cog):
         }
         self.current_jobs: List[str] = []
         self.user_jobs: Dict[str, List[str]] = {}  # Store unlocked jobs per user
-        self.load_job_data()
 
-    def load_job_data(self):
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        
-        if os.path.exists(self.jobs_file):
-            with open(self.jobs_file, 'r') as f:
-                data = json.load(f)
-                self.current_jobs = data.get('current_jobs', [])
-                # Load user jobs
-                self.user_jobs = data.get('user_jobs', {})
+    async def cog_load(self):
+        await self.load_job_data()
+
+    async def load_job_data(self):
+        self.user_jobs = await storage.load("user_jobs")
+        current_jobs = await storage.load_document("current_jobs")
+        if current_jobs is None:
+            await self.rotate_jobs()
         else:
-            self.rotate_jobs()
+            self.current_jobs = current_jobs
 
-    def save_job_data(self):
-        data = {
-            'current_jobs': self.current_jobs,
-            'user_jobs': self.user_jobs
-        }
-        with open(self.jobs_file, 'w') as f:
-            json.dump(data, f)
+    async def save_job_data(self, user_id=None):
+        """Persist unlocked jobs, only the given user's row if the backend supports it"""
+        keys = [user_id] if user_id is not None else None
+        # Copy so the I/O thread doesn't serialize lists that are being changed
+        user_jobs = {uid: list(jobs) for uid, jobs in self.user_jobs.items()}
+        await storage.save("user_jobs", user_jobs, keys)
 
-    def rotate_jobs(self):
+    async def rotate_jobs(self):
         # Make all jobs available
         self.current_jobs = list(self.jobs.keys())
-        self.save_job_data()
+        await storage.save_document("current_jobs", self.current_jobs)
         print(f"Available jobs: {self.current_jobs}")
 
     async def get_bank_data(self):
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        
-        if not os.path.exists('data/bank.json'):
-            with open('data/bank.json', 'w') as f:
-                json.dump({}, f)
-
-        with open('data/bank.json', 'r') as f:
-            content = f.read().strip()
-            if not content:
-                users = {}
-            else:
-                try:
-                    users = json.loads(content)
-                except json.JSONDecodeError:
-                    users = {}
-            
-        if not content:
-            with open('data/bank.json', 'w') as f:
-                json.dump(users, f)
-                
-        return users
+        return bank_store.get_bank_data()
 
     async def open_account(self, user):
-        users = await self.get_bank_data()
         user_id = str(user.id)
-
-        if user_id not in users:
-            users[user_id] = {}
-            users[user_id]["wallet"] = 50
-            users[user_id]["bank"] = 0
-            users[user_id]["last_work"] = None
-            with open('data/bank.json', 'w') as f:
-                json.dump(users, f)
+        bank_store.open_account(user_id, wallet=50, last_work=None)
 
         if user_id not in self.user_jobs:
             self.user_jobs[user_id] = []
-            self.save_job_data()
+            await self.save_job_data(user_id)
 
         return True
 
@@ -329,7 +296,16 @@ class JobMarketCog(commands.Cog):
         job_info = self.jobs[job_name]
         users = await self.get_bank_data()
         
-        if users[user_id]["wallet"] < job_info['cost']:
+        # Check the price and buy under the account's lock
+        async with account_locks.hold(user_id):
+            enough = users[user_id]["wallet"] >= job_info['cost']
+            if enough:
+                # Purchase the job
+                bank_store.apply(user_id, wallet=-job_info['cost'], reason="buyjob")
+                user_jobs.append(job_name)
+                self.user_jobs[user_id] = user_jobs
+        
+        if not enough:
             embed = discord.Embed(
                 title="Error",
                 description=f"You don't have enough coins! You need {job_info['cost']} coins to unlock this job.",
@@ -338,15 +314,7 @@ class JobMarketCog(commands.Cog):
             await ctx.send(embed=embed)
             return
             
-        # Purchase the job
-        users[user_id]["wallet"] -= job_info['cost']
-        user_jobs.append(job_name)
-        self.user_jobs[user_id] = user_jobs
-        self.save_job_data()
-        
-        # Save updated wallet
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
+        await self.save_job_data(user_id)
             
         embed = discord.Embed(
             title="🎉 Job Unlocked!",
@@ -402,7 +370,7 @@ class JobMarketCog(commands.Cog):
         # Remove the job
         user_jobs.remove(job_name)
         self.user_jobs[user_id] = user_jobs
-        self.save_job_data()
+        await self.save_job_data(user_id)
         
         embed = discord.Embed(
             title="🗑️ Job Removed",
@@ -427,7 +395,7 @@ class JobMarketCog(commands.Cog):
     async def work(self, ctx):
         """Work at all your jobs to earn money"""
         await self.open_account(ctx.author)
-        self.rotate_jobs()
+        await self.rotate_jobs()
         
         user_id = str(ctx.author.id)
         user_jobs = self.get_user_jobs(user_id)
@@ -462,11 +430,8 @@ class JobMarketCog(commands.Cog):
             total_earnings += earnings
             
         # Update user's wallet
-        users[user_id]["wallet"] += total_earnings
-        
-        # Save updated data
-        with open('data/bank.json', 'w') as f:
-            json.dump(users, f)
+        async with account_locks.hold(user_id):
+            bank_store.apply(user_id, wallet=total_earnings, reason="work")
             
         # Create and send embed
         embed = discord.Embed(
@@ -1,12 +1,22 @@
 import discord
+import asyncio
+import io
+import time
+from collections import deque
 from discord.ext import commands
-import json
 import os
 import math # not needed as backup
 import datetime # not needed as backup
 import random # not needed as backup
 from dotenv import load_dotenv
-import requests
+
+from lastfm_api import LastFMClient, LastFMError
+from nowplaying import NowPlayingPoller
+from scrobbles import PERIOD_NAMES, PERIODS, ScrobbleStore, ScrobbleSync, parse_period, run_db
+from whoknows import ArtistIndex
+from links import LinkRegistry
+from profiles import profile_cache
+from covers import CHARTS_AVAILABLE, CoverCache, get_chart_executor, render_chart, shutdown_chart_executor
 
 load_dotenv()
 
@@ -15,15 +25,76 @@ lastfmKey = os.getenv("lastfm_key")
 class LastFMCog(commands.Cog):
     def __init__(self, client):
         self.client = client
+        # One pooled HTTP session for every Last.fm call, opened in cog_load
+        self.api = LastFMClient(lastfmKey)
+        # Discord id <-> Last.fm username links, loaded in cog_load
+        self.links = LinkRegistry()
+        # -servernowplaying: parallel requests, seconds to wait per profile, seconds between edits
+        self.snp_concurrency = 8
+        self.snp_timeout = 5
+        self.snp_edit_interval = 1.5
+        # Polls linked accounts in the background so -servernowplaying can answer from memory
+        self.poller = NowPlayingPoller(self.get_now_playing, playing_interval=30, idle_interval=180, budget=1.0)
+        # -np: seconds to wait for each scrobble count lookup, recent timings for -botstats
+        self.np_info_timeout = 4
+        self.np_latency = deque(maxlen=200)
+        # Local scrobble mirror for the top commands, opened in cog_load
+        self.scrobble_store = None
+        self.scrobble_sync = None
+        self.scrobble_refresh = 10 * 60  # top commands sync in the background when older than this
+        # Artist -> play count per user for -whoknows, fed by the scrobble sync
+        self.artist_index = ArtistIndex()
+        # Album covers for -chart, cached on disk
+        self.covers = CoverCache()
         # Ensure data directory exists
         if not os.path.exists('data'):
             os.makedirs('data')
 
+    async def cog_load(self):
+        await self.api.start()
+        await self.links.load()
+        usernames = self.links.usernames()
+        self.poller.start(usernames)
+        self.scrobble_store = await run_db(ScrobbleStore)
+        self.scrobble_sync = ScrobbleSync(self.api, self.scrobble_store)
+        self.artist_index.rebuild(await run_db(self.scrobble_store.artist_plays))
+        self.scrobble_sync.on_import.append(self.artist_index.add_scrobbles)
+        self.scrobble_sync.start(usernames)
+
+    async def cog_unload(self):
+        await self.poller.close()
+        if self.scrobble_sync:
+            await self.scrobble_sync.close()
+        await self.api.close()
+        shutdown_chart_executor()
+
+    def linked_accounts_changed(self):
+        """Point the background pollers at the currently linked accounts"""
+        self.poller.sync(self.links.usernames())
+        if self.scrobble_sync:
+            # Unlinked accounts lose their mirrored history and their -whoknows entries
+            for lastfm_username in self.scrobble_sync.sync(self.links.usernames()):
+                self.artist_index.remove_user(lastfm_username)
+
     # link lastfm account to bot
     @commands.command()
     async def login(self, ctx, lastfm_username):
         user_id = ctx.author.id
-        self.update_user_data(user_id, lastfm_username)
+        
+        # One Last.fm account per member, otherwise -whoknows would count it twice
+        others = self.links.linked_to(lastfm_username) - {str(user_id)}
+        if others:
+            embed = discord.Embed(
+                title="Account Already Linked",
+                description=f"The LastFM account `{lastfm_username}` is already linked to another member.",
+                color=discord.Color.red()
+            )
+            embed.set_footer(text=f"Requested by {ctx.author.name}", 
+                            icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+            await ctx.send(embed=embed)
+            return
+        
+        await self.update_user_data(user_id, lastfm_username)
         embed = discord.Embed(
             title="LastFM Account Linked",
             description=f"Your LastFM account has been linked to Leurs!",
@@ -33,31 +104,18 @@ class LastFMCog(commands.Cog):
                         icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
         await ctx.send(embed=embed)
 
-    def update_user_data(self, user_id, lastfm_username):
-        try: 
-            with open('data/lastfm.json', 'r') as f:
-                user_data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            user_data = {}
-
-        user_data[str(user_id)] = lastfm_username
+    async def update_user_data(self, user_id, lastfm_username):
+        await self.links.link(user_id, lastfm_username)
+        self.linked_accounts_changed()
 
-        with open('data/lastfm.json', 'w') as f:
-            json.dump(user_data, f)
-
-    def get_lastfm_username(self, user_id):
-        try:
-            with open('data/lastfm.json', 'r') as f:
-                user_data = json.load(f)
-            return user_data.get(str(user_id))
-        except (FileNotFoundError, json.JSONDecodeError):
-            return None
+    async def get_lastfm_username(self, user_id):
+        return self.links.get(user_id)
 
     # show lastfm profile including scrobbles, registered date, total tracks, etc.
     @commands.command(name="lastfm", aliases=["lf", "profile", "me", "p"])
     async def lastfm_stats(self, ctx):
         user_id = ctx.author.id
-        lastfm_username = self.get_lastfm_username(user_id)
+        lastfm_username = await self.get_lastfm_username(user_id)
         
         if not lastfm_username:
             embed = discord.Embed(
@@ -70,13 +128,9 @@ class LastFMCog(commands.Cog):
             await ctx.send(embed=embed)
             return
 
-        # Get user info
-        user_info_url = f"http://ws.audioscrobbler.com/2.0/?method=user.getInfo&user={lastfm_username}&api_key={lastfmKey}&format=json"
-        
         try:
-            response = requests.get(user_info_url)
-            response.raise_for_status()
-            user_info = response.json()['user']
+            # Get user info
+            user_info = (await self.api.call("user.getInfo", user=lastfm_username))['user']
 
             # Extract user information
             total_scrobbles = user_info['playcount']
@@ -101,13 +155,10 @@ class LastFMCog(commands.Cog):
             stats += f"**Account Created:** {registered_date}\n"
             
             # Get recent track count
-            recent_tracks_url = f"http://ws.audioscrobbler.com/2.0/?method=user.getRecentTracks&user={lastfm_username}&api_key={lastfmKey}&format=json&limit=1"
-            recent_response = requests.get(recent_tracks_url)
-            if recent_response.ok:
-                recent_data = recent_response.json()
-                if 'recenttracks' in recent_data and '@attr' in recent_data['recenttracks']:
-                    total_tracks = recent_data['recenttracks']['@attr']['total']
-                    stats += f"**Total Tracks:** {total_tracks}"
+            recent_data = await self.get_info("user.getRecentTracks", user=lastfm_username, limit=1)
+            if 'recenttracks' in recent_data and '@attr' in recent_data['recenttracks']:
+                total_tracks = recent_data['recenttracks']['@attr']['total']
+                stats += f"**Total Tracks:** {total_tracks}"
 
             embed.description = stats
             
@@ -121,20 +172,19 @@ class LastFMCog(commands.Cog):
             )
             await ctx.send(embed=embed)
 
-    def get_track_info(self, artist, track):
-        url = f"http://ws.audioscrobbler.com/2.0/?method=track.getInfo&artist={artist}&track={track}&username={self.lastfm_username}&api_key={lastfmKey}&format=json"
+    async def get_info(self, method, timeout=None, **params):
+        """Call an API method for optional extra info, returns {} if it fails"""
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()
-        except:
-            return None
+            return await self.api.call(method, timeout=timeout, **params)
+        except LastFMError as e:
+            print(f"Error fetching {method}: {e}")
+            return {}
      
     # show current playing track if there is one
     @commands.command()
     async def np(self, ctx):
         user_id = ctx.author.id
-        lastfm_username = self.get_lastfm_username(user_id)
+        lastfm_username = await self.get_lastfm_username(user_id)
         
         if not lastfm_username:
             embed = discord.Embed(
@@ -147,13 +197,11 @@ class LastFMCog(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        # Get current playing track
-        url = f"http://ws.audioscrobbler.com/2.0/?method=user.getRecentTracks&user={lastfm_username}&api_key={lastfmKey}&format=json&limit=1"
-
+        started = time.perf_counter()
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            # Get current playing track
+            data = await self.api.call("user.getRecentTracks", user=lastfm_username, limit=1)
+            recent_done = time.perf_counter()
 
             if 'recenttracks' in data and 'track' in data['recenttracks']:
                 tracks = data['recenttracks']['track']
@@ -180,21 +228,21 @@ class LastFMCog(commands.Cog):
                 album = current_track.get('album', {}).get('#text', 'No album info')
                 image_url = current_track.get('image', [])[-1]['#text'] if current_track.get('image') else None
                 
-                # Get track info for playcount
-                track_info_url = f"http://ws.audioscrobbler.com/2.0/?method=track.getInfo&api_key={lastfmKey}&artist={artist}&track={song}&username={lastfm_username}&format=json"
-                track_info = requests.get(track_info_url).json()
-                
-                playcount = track_info.get('track', {}).get('userplaycount', '0')
-                
-                # Get artist info for scrobble count
-                artist_info_url = f"http://ws.audioscrobbler.com/2.0/?method=artist.getInfo&api_key={lastfmKey}&artist={artist}&username={lastfm_username}&format=json"
-                artist_info = requests.get(artist_info_url).json()
-                artist_scrobbles = artist_info.get('artist', {}).get('stats', {}).get('userplaycount', '0')
+                # Track, artist and album scrobble counts don't depend on each other, fetch them together.
+                # A lookup that fails or times out comes back empty and its count shows as "?"
+                track_info, artist_info, album_info = await asyncio.gather(
+                    self.get_info("track.getInfo", timeout=self.np_info_timeout,
+                                  artist=artist, track=song, username=lastfm_username),
+                    self.get_info("artist.getInfo", timeout=self.np_info_timeout,
+                                  artist=artist, username=lastfm_username),
+                    self.get_info("album.getInfo", timeout=self.np_info_timeout,
+                                  artist=artist, album=album, username=lastfm_username),
+                )
+                info_done = time.perf_counter()
                 
-                # Get album info for scrobble count
-                album_info_url = f"http://ws.audioscrobbler.com/2.0/?method=album.getInfo&api_key={lastfmKey}&artist={artist}&album={album}&username={lastfm_username}&format=json"
-                album_info = requests.get(album_info_url).json()
-                album_scrobbles = album_info.get('album', {}).get('userplaycount', '0')
+                playcount = track_info.get('track', {}).get('userplaycount', '0') if track_info else '?'
+                artist_scrobbles = artist_info.get('artist', {}).get('stats', {}).get('userplaycount', '0') if artist_info else '?'
+                album_scrobbles = album_info.get('album', {}).get('userplaycount', '0') if album_info else '?'
                 
                 # Create embed
                 embed = discord.Embed(color=0x2b2d31)  # Dark theme color
@@ -228,6 +276,15 @@ class LastFMCog(commands.Cog):
                 embed.add_field(name="", value=scrobble_stats, inline=False)
                 
                 await ctx.send(embed=embed)
+                
+                # End-to-end latency (ms) split into the recent track, the info lookups and sending
+                finished = time.perf_counter()
+                self.np_latency.append((
+                    (finished - started) * 1000,
+                    (recent_done - started) * 1000,
+                    (info_done - recent_done) * 1000,
+                    (finished - info_done) * 1000,
+                ))
             else:
                 raise Exception("No track data found")
                 
@@ -242,89 +299,132 @@ class LastFMCog(commands.Cog):
     @commands.command(aliases=["snp"])
     async def servernowplaying(self, ctx):
         try:
-            # Load LastFM usernames from json
-            with open('data/lastfm.json', 'r') as f:
-                lastfm_data = json.load(f)
+            # Linked LastFM usernames
+            usernames = self.links.usernames()
             
-            if not lastfm_data:
+            if not usernames:
                 await ctx.send("No LastFM accounts are linked to any server members.")
                 return
                 
-            playing_users = []
+            total = len(usernames)
+            failed = 0
+            message = None
             
-            # Check each linked LastFM account
-            for user_id, lastfm_username in lastfm_data.items():
-                # Use the same logic as the np command
-                url = f"http://ws.audioscrobbler.com/2.0/?method=user.getRecentTracks&user={lastfm_username}&api_key={lastfmKey}&format=json&limit=1"
+            # The poller keeps a snapshot of everyone, only accounts it hasn't reached yet
+            # (right after startup or a new login) are checked live
+            missing = [name for name in dict.fromkeys(usernames) if name not in self.poller.snapshot]
+            if missing:
+                checked = total - len(missing)
+                message = await ctx.send(embed=self.build_snp_embed(self.snapshot_playing(usernames), total, checked=checked))
+                last_edit = asyncio.get_running_loop().time()
                 
-                try:
-                    response = requests.get(url)
-                    response.raise_for_status()
-                    data = response.json()
+                # Check the missing accounts at once, a few requests at a time
+                semaphore = asyncio.Semaphore(self.snp_concurrency)
+                
+                async def check(lastfm_username):
+                    async with semaphore:
+                        return lastfm_username, await self.get_now_playing(lastfm_username, timeout=self.snp_timeout)
+                
+                for next_result in asyncio.as_completed([check(name) for name in missing]):
+                    try:
+                        lastfm_username, track = await next_result
+                        self.poller.record(lastfm_username, track)
+                    except Exception as e:
+                        # One slow or broken profile shouldn't hold up everyone else
+                        print(f"Error fetching now playing: {str(e)}")
+                        failed += 1
+                    checked += 1
                     
-                    if 'recenttracks' in data and 'track' in data['recenttracks']:
-                        tracks = data['recenttracks']['track']
-                        if tracks:
-                            current_track = tracks[0]
-                            
-                            # Check if track is currently playing
-                            is_playing = '@attr' in current_track and current_track['@attr'].get('nowplaying') == 'true'
-                            
-                            if is_playing:
-                                artist = current_track['artist']['#text']
-                                song = current_track['name']
-                                
-                                playing_users.append({
-                                    'username': lastfm_username,
-                                    'song': song,
-                                    'artist': artist
-                                })
-                                
-                except Exception as e:
-                    print(f"Error fetching data for {lastfm_username}: {str(e)}")
-                    continue
-            
-            # Create embed
-            embed = discord.Embed(
-                title="Currently Playing in Server",
-                color=0x2b2d31
-            )
+                    # Show results as they arrive, without hitting Discord's edit rate limit
+                    loop_time = asyncio.get_running_loop().time()
+                    if checked < total and loop_time - last_edit >= self.snp_edit_interval:
+                        await message.edit(embed=self.build_snp_embed(self.snapshot_playing(usernames), total, checked=checked))
+                        last_edit = loop_time
             
-            if playing_users:
-                description = "\n"  # Add initial spacing after header
-                for i, user in enumerate(playing_users):
-                    # Create clickable links
-                    artist_url = f"https://www.last.fm/music/{user['artist'].replace(' ', '+')}"
-                    track_url = f"https://www.last.fm/music/{user['artist'].replace(' ', '+')}/{user['song'].replace(' ', '+')}"
-                    profile_url = f"https://www.last.fm/user/{user['username']}"
-                    
-                    description += f"[{user['username']}]({profile_url})\n"
-                    description += f"[{user['song']}]({track_url}) - [{user['artist']}]({artist_url})"
-                    
-                    if i < len(playing_users) - 1:
-                        description += "\n\n"
-                
-                # Add summary line with same spacing as header
-                description += "\n\n"
-                description += f"Users currently listening: {len(playing_users)} - Total users with LastFM: {len(lastfm_data)}"
-                embed.description = description
+            # How old the snapshot is at worst
+            checked_times = [self.poller.snapshot[name][1] for name in usernames if name in self.poller.snapshot]
+            updated = min(checked_times) if checked_times else None
+            embed = self.build_snp_embed(self.snapshot_playing(usernames), total, failed=failed, updated=updated)
+            if message:
+                await message.edit(embed=embed)
             else:
-                embed.description = f"No one is currently listening to music\nTotal users with LastFM: {len(lastfm_data)}"
-                
-            await ctx.send(embed=embed)
+                await ctx.send(embed=embed)
             
         except Exception as e:
             print(f"Error in servernowplaying: {str(e)}")
             await ctx.send("An error occurred while fetching currently playing tracks.")
 
+    def snapshot_playing(self, usernames):
+        """Tracks from the now-playing snapshot for the given accounts, with when each was checked"""
+        return [dict(track, checked=checked) for _, track, checked in self.poller.playing(usernames)]
+
+    async def get_now_playing(self, lastfm_username, timeout=None):
+        """The track a user is playing right now as a dict, or None if they aren't"""
+        data = await self.api.call("user.getRecentTracks", user=lastfm_username, limit=1, timeout=timeout)
+        
+        tracks = data.get('recenttracks', {}).get('track')
+        if not tracks:
+            return None
+        current_track = tracks[0]
+        
+        # Check if track is currently playing
+        is_playing = '@attr' in current_track and current_track['@attr'].get('nowplaying') == 'true'
+        if not is_playing:
+            return None
+        
+        return {
+            'username': lastfm_username,
+            'song': current_track['name'],
+            'artist': current_track['artist']['#text']
+        }
+
+    def build_snp_embed(self, playing_users, total, checked=None, failed=0, updated=None):
+        """Embed for -servernowplaying, ``checked`` is set while results are still coming in"""
+        embed = discord.Embed(
+            title="Currently Playing in Server",
+            color=0x2b2d31
+        )
+        
+        if playing_users:
+            description = "\n"  # Add initial spacing after header
+            for i, user in enumerate(playing_users):
+                # Create clickable links
+                artist_url = f"https://www.last.fm/music/{user['artist'].replace(' ', '+')}"
+                track_url = f"https://www.last.fm/music/{user['artist'].replace(' ', '+')}/{user['song'].replace(' ', '+')}"
+                profile_url = f"https://www.last.fm/user/{user['username']}"
+                
+                description += f"[{user['username']}]({profile_url})\n"
+                description += f"[{user['song']}]({track_url}) - [{user['artist']}]({artist_url})"
+                if user.get('checked'):
+                    description += f" • <t:{int(user['checked'])}:R>"
+                
+                if i < len(playing_users) - 1:
+                    description += "\n\n"
+            
+            # Add summary line with same spacing as header
+            description += "\n\n"
+            description += f"Users currently listening: {len(playing_users)} - Total users with LastFM: {total}"
+            embed.description = description
+        elif checked is not None:
+            embed.description = f"Checking who is listening...\nTotal users with LastFM: {total}"
+        else:
+            embed.description = f"No one is currently listening to music\nTotal users with LastFM: {total}"
+        
+        if updated:
+            embed.description += f"\nUpdated <t:{int(updated)}:R>"
+        
+        if checked is not None:
+            embed.set_footer(text=f"Checked {checked}/{total} accounts...")
+        elif failed:
+            embed.set_footer(text=f"{failed} account(s) didn't respond in time")
+        
+        return embed
+
     @commands.command()
     async def logout(self, ctx):
         user_id = ctx.author.id
         try:
-            with open('data/lastfm.json', 'r') as f:
-                user_data = json.load(f)
-                
-            if str(user_id) not in user_data:
+            if self.links.get(user_id) is None:
                 embed = discord.Embed(
                     title="Not Logged In",
                     description="You don't have a LastFM account linked.",
@@ -335,12 +435,9 @@ class LastFMCog(commands.Cog):
                 await ctx.send(embed=embed)
                 return
                 
-            # Remove the user's data
-            del user_data[str(user_id)]
-            
-            # Save the updated data
-            with open('data/lastfm.json', 'w') as f:
-                json.dump(user_data, f)
+            # Remove the link, it is saved right away
+            await self.links.unlink(user_id)
+            self.linked_accounts_changed()
                 
             embed = discord.Embed(
                 title="LastFM Account Unlinked",
@@ -355,6 +452,222 @@ class LastFMCog(commands.Cog):
             print(f"Error in logout: {str(e)}")
             await ctx.send("An error occurred while trying to unlink your LastFM account.")
 
+    # show most played artists, albums or tracks from the local scrobble mirror
+    @commands.command(aliases=["ta"])
+    async def topartists(self, ctx, period=None):
+        await self.send_top(ctx, "artist", period)
+
+    @commands.command(aliases=["tab"])
+    async def topalbums(self, ctx, period=None):
+        await self.send_top(ctx, "album", period)
+
+    @commands.command(aliases=["tt"])
+    async def toptracks(self, ctx, period=None):
+        await self.send_top(ctx, "track", period)
+
+    async def send_top(self, ctx, kind, period):
+        lastfm_username = await self.get_lastfm_username(ctx.author.id)
+        
+        if not lastfm_username:
+            embed = discord.Embed(
+                title="LastFM Not Linked",
+                description="You haven't linked your LastFM account yet. Use `-login [username]` to link it!",
+                color=discord.Color.red()
+            )
+            embed.set_footer(text=f"Requested by {ctx.author.name}", 
+                           icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+            await ctx.send(embed=embed)
+            return
+        
+        period_key = parse_period(period)
+        if period_key is None:
+            embed = discord.Embed(
+                title="Invalid Period",
+                description="Please use one of `7d`, `30d`, `year` or `all`.",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        state = await self.scrobble_state(ctx, lastfm_username)
+        if not state:
+            return
+        
+        seconds = PERIODS[period_key]
+        since = int(time.time()) - seconds if seconds else None
+        rows = await run_db(self.scrobble_store.top, lastfm_username, kind, since, 10)
+        
+        embed = discord.Embed(
+            title=f"Top {kind.capitalize()}s • {PERIOD_NAMES[period_key].capitalize()}",
+            color=0x2b2d31
+        )
+        embed.set_author(name=f"Last.fm: {lastfm_username}", 
+                       icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+        
+        if rows:
+            description = ""
+            for i, row in enumerate(rows, start=1):
+                artist = row[0]
+                artist_url = f"https://www.last.fm/music/{artist.replace(' ', '+')}"
+                if kind == "artist":
+                    plays = row[1]
+                    description += f"{i}. [{artist}]({artist_url}) - **{plays}** plays\n"
+                else:
+                    name, plays = row[1], row[2]
+                    url = f"{artist_url}/{name.replace(' ', '+')}" if kind == "album" else f"{artist_url}/_/{name.replace(' ', '+')}"
+                    description += f"{i}. [{name}]({url}) by {artist} - **{plays}** plays\n"
+            description += f"\nSynced <t:{int(state[1])}:R>"
+            embed.description = description
+        else:
+            embed.description = f"No scrobbles in the {PERIOD_NAMES[period_key]}."
+        
+        await ctx.send(embed=embed)
+
+    async def scrobble_state(self, ctx, lastfm_username):
+        """Sync state of a user's scrobble mirror, or None (and a notice) while it is first imported"""
+        state = await run_db(self.scrobble_store.sync_state, lastfm_username)
+        if not state or not state[1]:
+            # Nothing to answer from until the first import is done
+            self.scrobble_sync.request_sync(lastfm_username)
+            embed = discord.Embed(
+                title="Importing Scrobbles",
+                description="Your Last.fm history is being imported. This can take a few minutes for big libraries, try again shortly!",
+                color=discord.Color.orange()
+            )
+            await ctx.send(embed=embed)
+            return None
+        
+        if time.time() - state[1] > self.scrobble_refresh:
+            # Answer from what we have, newer scrobbles show up next time
+            self.scrobble_sync.request_sync(lastfm_username)
+        return state
+
+    # album cover collage of the user's top albums
+    @commands.command(aliases=["c"])
+    async def chart(self, ctx, *args):
+        lastfm_username = await self.get_lastfm_username(ctx.author.id)
+        
+        if not lastfm_username:
+            embed = discord.Embed(
+                title="LastFM Not Linked",
+                description="You haven't linked your LastFM account yet. Use `-login [username]` to link it!",
+                color=discord.Color.red()
+            )
+            embed.set_footer(text=f"Requested by {ctx.author.name}", 
+                           icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+            await ctx.send(embed=embed)
+            return
+        
+        if not CHARTS_AVAILABLE:
+            embed = discord.Embed(
+                title="Charts Unavailable",
+                description="Charts need Pillow, which isn't installed on this bot.",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        # Period and size may come in any order, e.g. "-chart 7d 4x4" or "-chart 5"
+        period_key, size = "7d", 3
+        for arg in args:
+            arg = arg.lower()
+            if arg.replace("x", "").isdigit() and arg.split("x")[0] in ("3", "4", "5"):
+                size = int(arg.split("x")[0])
+            elif parse_period(arg):
+                period_key = parse_period(arg)
+            else:
+                embed = discord.Embed(
+                    title="Invalid Chart Option",
+                    description="Usage: `-chart [7d|30d|year|all] [3x3|4x4|5x5]`",
+                    color=discord.Color.red()
+                )
+                await ctx.send(embed=embed)
+                return
+        
+        state = await self.scrobble_state(ctx, lastfm_username)
+        if not state:
+            return
+        
+        seconds = PERIODS[period_key]
+        since = int(time.time()) - seconds if seconds else None
+        rows = await run_db(self.scrobble_store.top, lastfm_username, "album", since, size * size)
+        if not rows:
+            embed = discord.Embed(
+                color=0x2b2d31,
+                description=f"No album scrobbles in the {PERIOD_NAMES[period_key]}."
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        async with ctx.typing():
+            # Covers come from the disk cache or are downloaded together, the collage is
+            # drawn in a worker process
+            await self.api.start()
+            paths = await self.covers.fetch_many(self.api.session, [row[3] for row in rows])
+            loop = asyncio.get_running_loop()
+            image = await loop.run_in_executor(get_chart_executor(), render_chart, paths, size)
+        
+        embed = discord.Embed(
+            title=f"{size}x{size} Album Chart • {PERIOD_NAMES[period_key].capitalize()}",
+            color=0x2b2d31
+        )
+        embed.set_author(name=f"Last.fm: {lastfm_username}", 
+                       icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+        embed.set_image(url="attachment://chart.png")
+        await ctx.send(embed=embed, file=discord.File(io.BytesIO(image), filename="chart.png"))
+
+    # rank server members by how much they listened to an artist
+    @commands.command(aliases=["wk"])
+    async def whoknows(self, ctx, *, artist=None):
+        if artist is None:
+            # Default to the artist the author is listening to right now
+            lastfm_username = self.links.get(ctx.author.id)
+            track = None
+            if lastfm_username:
+                try:
+                    track = await self.get_now_playing(lastfm_username)
+                except LastFMError as e:
+                    print(f"Error fetching now playing: {str(e)}")
+            if not track:
+                embed = discord.Embed(
+                    title="No Artist Given",
+                    description="Use `-whoknows <artist>`, or run it while playing something on Last.fm.",
+                    color=discord.Color.red()
+                )
+                await ctx.send(embed=embed)
+                return
+            artist = track['artist']
+        
+        # Every linked account is ranked, the member cache only holds a few members
+        owners = {lastfm_username: user_id for user_id, lastfm_username in self.links.items()}
+        
+        top = self.artist_index.top(artist, k=10, usernames=owners)
+        artist_name = self.artist_index.name(artist) or artist
+        
+        embed = discord.Embed(
+            title=f"Who knows {artist_name}?",
+            color=0x2b2d31
+        )
+        
+        if top:
+            # Names are only needed for the rows shown
+            profiles = await profile_cache.resolve_many(
+                self.client, ctx.guild, [owners[lastfm_username] for lastfm_username, _ in top]
+            )
+            description = ""
+            for i, (lastfm_username, plays) in enumerate(top, start=1):
+                profile_url = f"https://www.last.fm/user/{lastfm_username}"
+                name, _ = profiles[owners[lastfm_username]]
+                description += f"{i}. [{name}]({profile_url}) - **{plays}** plays\n"
+            embed.description = description
+            listeners = self.artist_index.listener_count(artist, usernames=owners)
+            embed.set_footer(text=f"{listeners} listener(s) with a linked account • Requested by {ctx.author.name}", 
+                           icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
+        else:
+            embed.description = f"Nobody here has scrobbled {artist_name} yet."
+        
+        await ctx.send(embed=embed)
+
 async def setup(client):
     try:
         await client.add_cog(LastFMCog(client))
@@ -0,0 +1,242 @@
+import asyncio
+import random
+
+import aiohttp
+
+from cache import TTLCache
+from ratelimit import AsyncTokenBucket
+
+API_URL = "https://ws.audioscrobbler.com/2.0/"
+
+# Seconds a successful response stays cached, methods not listed here are never cached.
+# Recent tracks change with every song; artist, album and track metadata barely changes.
+METHOD_TTLS = {
+    "user.getrecenttracks": 15,
+    "user.getinfo": 10 * 60,
+    "track.getinfo": 6 * 3600,
+    "artist.getinfo": 6 * 3600,
+    "album.getinfo": 6 * 3600,
+}
+# Responses for a ``username`` include their play counts, which go up as they scrobble
+USER_SCOPED_TTL = 5 * 60
+
+# Last.fm matches these case-insensitively, so "Daft Punk" and "daft punk " share an entry
+NAME_PARAMS = ("artist", "track", "album", "user", "username")
+
+# Last.fm error codes worth retrying: operation failed, service offline,
+# temporarily unavailable, rate limit exceeded
+RETRY_CODES = {8, 11, 16, 29}
+
+
+class LastFMError(Exception):
+    """Raised when Last.fm can't be reached or answers with an error"""
+
+    def __init__(self, message, code=None, status=None, retry_after=None):
+        super().__init__(message)
+        self.code = code  # Last.fm error code from the response body, if any
+        self.status = status  # HTTP status, if a response came back
+        self.retry_after = retry_after  # seconds from a Retry-After header, if any
+
+    @property
+    def retryable(self):
+        """Rate limits, server errors and dropped connections, but not timeouts"""
+        if self.code in RETRY_CODES:
+            return True
+        if self.status is not None:
+            return self.status == 429 or self.status >= 500
+        return isinstance(self.__cause__, aiohttp.ClientError)
+
+    @property
+    def rate_limited(self):
+        return self.status == 429 or self.code == 29
+
+
+class LastFMClient:
+    """Async Last.fm API client sharing one pooled HTTP session.
+
+    The session keeps connections to Last.fm alive between calls, so a command only
+    pays for the TLS handshake once. Query parameters are encoded by aiohttp, which
+    means artist and track names with spaces, ``&`` or ``#`` arrive intact.
+
+    Successful responses of the methods in ``METHOD_TTLS`` are kept in an LRU cache
+    keyed by method and normalized parameters, so repeated lookups of the same
+    artist, album or track don't reach Last.fm until their entry expires.
+
+    Everything that does reach Last.fm goes through one token bucket (``rate``
+    requests per second, bursts of ``burst``). Identical requests already in flight
+    share a single response. Rate limits and server errors are retried up to
+    ``max_retries`` times with exponential backoff and full jitter.
+
+    A caller's ``timeout`` covers all of that: throttling, retries and backoff. A
+    request shared by several callers keeps going until the latest of their
+    deadlines, and is not retried when the backoff would run past it.
+    """
+
+    def __init__(self, api_key, timeout=10, connect_timeout=5, max_connections=20, api_url=API_URL,
+                 cache_size=5000, rate=5, burst=10, max_retries=3, backoff_base=0.5, backoff_max=8):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.cache = TTLCache(maxsize=cache_size)
+        self.limiter = AsyncTokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._in_flight = {}  # request key -> task fetching it
+        self._deadlines = {}  # request key -> loop time its callers stop waiting, None for never
+        self.requests = 0  # HTTP requests sent, retries included
+        self.retried = 0
+        self.coalesced = 0  # calls answered by a request another call already had in flight
+        self.failed = 0  # calls that ended in an error after any retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_connections = max_connections
+        self.session = None
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    @staticmethod
+    def cache_key(method, params):
+        normalized = []
+        for key, value in sorted(params.items()):
+            value = str(value)
+            if key in NAME_PARAMS:
+                value = " ".join(value.split()).casefold()
+            normalized.append((key, value))
+        return (method.lower(), tuple(normalized))
+
+    def cache_ttl(self, method, params):
+        ttl = METHOD_TTLS.get(method.lower())
+        if ttl is not None and "username" in params:
+            ttl = min(ttl, USER_SCOPED_TTL)
+        return ttl
+
+    async def call(self, method, timeout=None, use_cache=True, **params):
+        """Call an API method and return the decoded JSON body.
+
+        ``timeout`` (seconds) bounds the whole call, retries included, instead of the
+        session's default per request. Cached responses are shared, callers must not
+        modify them.
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+        key = self.cache_key(method, params)
+        ttl = self.cache_ttl(method, params) if use_cache else None
+        if ttl is not None:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+
+        deadline = asyncio.get_running_loop().time() + timeout if timeout is not None else None
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # The shared request keeps going for whoever waits longest
+            current = self._deadlines.get(key)
+            self._deadlines[key] = None if current is None or deadline is None else max(current, deadline)
+        else:
+            self._deadlines[key] = deadline
+            task = asyncio.ensure_future(self._fetch(method, params, key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        # Shielded so one caller giving up doesn't cancel the request for the others
+        try:
+            data = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise LastFMError(f"{method} timed out") from None
+
+        if ttl is not None:
+            self.cache.set(key, data, ttl=ttl)
+        return data
+
+    def _forget(self, key, task):
+        self._in_flight.pop(key, None)
+        self._deadlines.pop(key, None)
+        # Every caller may have given up already, don't let the error go unretrieved
+        if not task.cancelled():
+            task.exception()
+
+    def _remaining(self, key):
+        """Seconds until the callers of a request stop waiting, None if they never do"""
+        deadline = self._deadlines.get(key)
+        if deadline is None:
+            return None
+        return deadline - asyncio.get_running_loop().time()
+
+    async def _fetch(self, method, params, key):
+        """Send a request, retrying rate limits and server errors with backoff"""
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            remaining = self._remaining(key)
+            if remaining is not None and remaining <= 0:
+                self.failed += 1
+                raise LastFMError(f"{method} timed out")
+            self.requests += 1
+            try:
+                return await self._request(method, params, remaining)
+            except LastFMError as e:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                remaining = self._remaining(key)
+                # Don't sleep past the point where every caller has given up
+                out_of_time = remaining is not None and delay >= remaining
+                if not e.retryable or attempt >= self.max_retries or out_of_time:
+                    self.failed += 1
+                    if e.rate_limited:
+                        raise LastFMError("Last.fm is rate limiting the bot, try again in a moment",
+                                          code=e.code, status=e.status) from e
+                    raise
+                attempt += 1
+                self.retried += 1
+                await asyncio.sleep(delay)
+
+    async def _request(self, method, params, timeout=None):
+        if self.session is None:
+            await self.start()
+
+        query = {"method": method, "api_key": self.api_key, "format": "json"}
+        query.update({key: str(value) for key, value in params.items()})
+        # Passing timeout=None to aiohttp would disable the session's timeout entirely
+        extra = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {}
+
+        try:
+            async with self.session.get(self.api_url, params=query, **extra) as response:
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = None
+                status = response.status
+                retry_after = response.headers.get("Retry-After")
+        except asyncio.TimeoutError as e:
+            raise LastFMError(f"{method} timed out") from e
+        except aiohttp.ClientError as e:
+            raise LastFMError(f"{method} failed: {e}") from e
+
+        retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+
+        # Last.fm reports errors in the body, usually alongside a 4xx/5xx status
+        if isinstance(data, dict) and "error" in data:
+            raise LastFMError(data.get("message", f"{method} failed"), code=data["error"], status=status,
+                              retry_after=retry_after)
+        if status >= 400 or data is None:
+            raise LastFMError(f"{method} failed with HTTP {status}", status=status, retry_after=retry_after)
+        return data
+
+    def stats(self):
+        limiter = self.limiter.stats()
+        return {
+            "requests": self.requests,
+            "throttled": limiter["throttled"],
+            "throttle_wait": limiter["waited"],
+            "retried": self.retried,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+        }
@@ -0,0 +1,148 @@
+import os
+import struct
+from array import array
+from collections import namedtuple
+
+from storage import run_io
+
+# user id, unix time, wallet delta, bank delta, wallet after, bank after, reason code
+RECORD = struct.Struct("<QIqqqqB3x")  # 48 bytes
+
+# Reason codes are stored in the file, so only ever append to this tuple
+REASONS = (
+    "other", "open", "beg", "work", "gamble", "deposit", "withdraw",
+    "admin_add", "admin_remove", "buyjob", "pay", "interest",
+)
+REASON_CODES = {reason: code for code, reason in enumerate(REASONS)}
+
+Transaction = namedtuple("Transaction", "user time wallet bank wallet_after bank_after reason")
+
+
+class TransactionLedger:
+    """Append-only file of fixed-width balance change records, with a per-user index.
+
+    Record n lives at byte ``n * RECORD.size``, so the index only has to keep record
+    numbers: one ``array('I')`` per user, 4 bytes per transaction. Reading a page of a
+    user's history is a slice of that array and one positioned read per record, no
+    matter how long the ledger is. The index is rebuilt with a single sequential scan
+    on startup.
+
+    BankStore appends records on the storage I/O thread together with its journal
+    line; reads run on the same thread, so they always see every record appended
+    before them.
+    """
+
+    def __init__(self, path='data/transactions.ledger'):
+        self.path = path
+        self.index = {}  # user id (str) -> record numbers, oldest first
+        self.count = 0
+        self.loaded = False
+        self._file = None
+        self._reader = None
+
+    def load(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size % RECORD.size:
+            # Torn final record from a crash mid-append
+            size -= size % RECORD.size
+            os.truncate(self.path, size)
+
+        self.index = {}
+        self.count = 0
+        if size:
+            with open(self.path, 'rb') as f:
+                while True:
+                    chunk = f.read(RECORD.size * 4096)
+                    if not chunk:
+                        break
+                    for record in RECORD.iter_unpack(chunk):
+                        self.index.setdefault(str(record[0]), array('I')).append(self.count)
+                        self.count += 1
+
+        self._file = open(self.path, 'ab', buffering=0)
+        self._reader = open(self.path, 'rb')
+        self.loaded = True
+
+    def reserve(self, entries):
+        """Give bank journal entries (as built by BankStore) their record numbers.
+
+        Runs on the loop, so ``count_for`` and ``history`` include them right away. The
+        caller then writes their ``pack``ed records on the I/O thread, in the same order.
+        """
+        for entry in entries:
+            self.index.setdefault(entry["user"], array('I')).append(self.count)
+            self.count += 1
+
+    def pack(self, entries):
+        """Records for entries already given numbers by ``reserve``"""
+        return b"".join(
+            RECORD.pack(
+                int(entry["user"]),
+                int(entry["time"]),
+                entry["wallet"],
+                entry["bank"],
+                entry["wallet_after"],
+                entry["bank_after"],
+                REASON_CODES.get(entry["reason"], 0),
+            )
+            for entry in entries
+        )
+
+    def write(self, records):
+        self._file.write(records)
+
+    def count_for(self, user_id):
+        return len(self.index.get(str(user_id), ()))
+
+    def _read(self, numbers):
+        fd = self._reader.fileno()
+        transactions = []
+        for number in numbers:
+            user, *fields, reason = RECORD.unpack(os.pread(fd, RECORD.size, number * RECORD.size))
+            transactions.append(Transaction(str(user), *fields, REASONS[reason]))
+        return transactions
+
+    def since(self, timestamp):
+        """Transactions made at or after ``timestamp``, oldest first.
+
+        Records are appended in time order, so this reads backwards from the end of
+        the file and stops at the first older record.
+        """
+        fd = self._reader.fileno()
+        transactions = []
+        end = self.count
+        while end > 0:
+            start = max(0, end - 4096)
+            chunk = os.pread(fd, (end - start) * RECORD.size, start * RECORD.size)
+            recent = [
+                Transaction(str(user), *fields, REASONS[reason])
+                for user, *fields, reason in RECORD.iter_unpack(chunk)
+                if fields[0] >= timestamp
+            ]
+            transactions[:0] = recent
+            if len(recent) < end - start:
+                break
+            end = start
+        return transactions
+
+    async def history(self, user_id, page=1, per_page=10):
+        """One page of a user's transactions, newest first"""
+        numbers = self.index.get(str(user_id))
+        if not numbers:
+            return []
+        end = len(numbers) - (page - 1) * per_page
+        if end <= 0:
+            return []
+        start = max(0, end - per_page)
+        return await run_io(self._read, numbers[start:end][::-1])
+
+    def close(self):
+        for f in (self._file, self._reader):
+            if f is not None:
+                f.close()
+        self._file = self._reader = None
+        self.loaded = False
@@ -1,10 +1,14 @@
 import discord
 from discord.ext import commands
-import json
-import os
 import math
 import datetime
 import random
+import asyncio
+
+import storage
+from profiles import profile_cache
+from ranking import RankIndex
+from ratelimit import KeyedTokenBucket
 
 class LevelsCog(commands.Cog):
     def __init__(self, client):
@@ -12,11 +16,38 @@ class LevelsCog(commands.Cog):
         # XP settings
         self.base_xp = 15  # Base XP per message
         self.xp_per_level = 7500  # XP needed for each level (500 messages = one level)
-        self.message_count = {}  # Track messages per minute
-        self.window_start = {}  # Track when the 60-second window started
-        # Voice tracking
-        self.voice_time = {}  # Track current voice sessions
-        self.voice_start = {}  # Track when users joined VC
+        # Levels live in memory, XP gains are written in batches every few seconds
+        self.levels = storage.CachedCollection("levels", flush_interval=5, flush_every=100)
+        self.level_rank = RankIndex()  # (level, xp) per user
+        # Anti-spam: bursts of up to 60 messages, refilling at 60 per minute.
+        # Users idle for 10 minutes are forgotten.
+        self.xp_limiter = KeyedTokenBucket(rate=60 / 60, capacity=60, idle_ttl=600)
+        # Voice tracking: totals live in memory and are checkpointed once a minute,
+        # so a crash loses at most one interval of voice time
+        self.voice = storage.CachedCollection("voice", flush_every=1000)
+        self.voice_start = {}  # Track when users joined VC (running sessions)
+        self.voice_rank = RankIndex()  # voice time per user, as of the last fold
+        self.voice_checkpoint_interval = 60
+        self._voice_checkpoint_task = None
+
+    async def cog_load(self):
+        await self.levels.start()
+        await self.voice.load()
+        self.level_rank.rebuild({
+            user_id: (data["level"], data["xp"])
+            for user_id, data in self.levels.data.items() if "xp" in data
+        })
+        self.voice_rank.rebuild({
+            user_id: data.get("voice_time", 0) for user_id, data in self.voice.data.items()
+        })
+        self._voice_checkpoint_task = asyncio.create_task(self._voice_checkpoint_loop())
+
+    async def cog_unload(self):
+        await self.levels.close()
+        if self._voice_checkpoint_task is not None:
+            self._voice_checkpoint_task.cancel()
+        self.checkpoint_voice()
+        await self.voice.flush()
         
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -27,113 +58,112 @@ class LevelsCog(commands.Cog):
         # Handle XP gain
         await self.add_xp(message.author, message.channel)
         
-    async def update_voice_time(self, member):
-        """Update voice time for users currently in voice chat"""
-        if not member.voice or member.voice.afk:
-            return
-            
-        user_id = str(member.id)
-        current_time = datetime.datetime.now().timestamp()
-        
-        # If user is in voice but not being tracked, start tracking them
-        if user_id not in self.voice_start and member.voice and not member.voice.afk:
+    def voice_total(self, user_id, current_time=None):
+        """Stored voice time plus the running session, without touching disk"""
+        user_id = str(user_id)
+        total = self.voice.data.get(user_id, {}).get("voice_time", 0)
+        if user_id in self.voice_start:
+            if current_time is None:
+                current_time = datetime.datetime.now().timestamp()
+            total += current_time - self.voice_start[user_id]
+        return total
+
+    def start_voice_session(self, user_id, current_time):
+        if user_id not in self.voice_start:
             self.voice_start[user_id] = current_time
-            self.voice_time[user_id] = 0
-            # Create user entry in voice data
-            await self.check_voice_user(member)
+
+    def end_voice_session(self, user_id, current_time):
+        """Move a session's time into the ledger, it's written at the next checkpoint"""
+        if user_id not in self.voice_start:
             return
-            
-        # If user is being tracked, update their time
-        if user_id in self.voice_start:
-            time_spent = current_time - self.voice_start[user_id]
-            
-            # Update voice data
-            voice_users = await self.get_voice_data()
-            await self.check_voice_user(member)  # Ensure user exists in database
-            
-            # Add time spent to total
-            voice_users[user_id]["voice_time"] = voice_users[user_id].get("voice_time", 0) + time_spent
-            
-            # Save voice data
-            with open('data/voice_levels.json', 'w') as f:
-                json.dump(voice_users, f)
-                
-            # Update tracking with new start time
+        time_spent = current_time - self.voice_start.pop(user_id)
+        entry = self.voice.data.setdefault(user_id, {"voice_time": 0})
+        entry["voice_time"] = entry.get("voice_time", 0) + time_spent
+        self.voice.mark_dirty(user_id)
+        self.voice_rank.update(user_id, entry["voice_time"])
+
+    def checkpoint_voice(self, current_time=None):
+        """Fold the time of every running session into the ledger"""
+        if current_time is None:
+            current_time = datetime.datetime.now().timestamp()
+        for user_id in list(self.voice_start):
+            self.end_voice_session(user_id, current_time)
             self.voice_start[user_id] = current_time
+
+    async def _voice_checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(self.voice_checkpoint_interval)
+            try:
+                self.checkpoint_voice()
+                await self.voice.flush()
+            except Exception as e:
+                print(f"Error checkpointing voice time: {e}")
+
+    async def reconcile_voice(self, guilds):
+        """Sync running sessions with who is actually in voice, in one pass and one write.
+
+        Walks the voice channels rather than the member list: members in voice get a
+        session if they have none (e.g. after a restart), sessions of people who left
+        while we weren't listening are closed, and all running time is folded in.
+        """
+        current_time = datetime.datetime.now().timestamp()
+        in_voice = set()
+        for guild in guilds:
+            for channel in guild.voice_channels + guild.stage_channels:
+                for user_id, state in channel.voice_states.items():
+                    if not state.afk:
+                        in_voice.add(str(user_id))
+
+        for user_id in list(self.voice_start):
+            if user_id not in in_voice:
+                self.end_voice_session(user_id, current_time)
+
+        for user_id in in_voice:
+            self.start_voice_session(user_id, current_time)
+            if user_id not in self.voice.data:
+                self.voice.data[user_id] = {"voice_time": 0}
+                self.voice.mark_dirty(user_id)
+                self.voice_rank.update(user_id, 0)
+
+        self.checkpoint_voice(current_time)
+        await self.voice.flush()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        try:
+            await self.reconcile_voice(self.client.guilds)
+        except Exception as e:
+            print(f"Error reconciling voice sessions: {e}")
+
+    async def update_voice_time(self, member):
+        """Start tracking a member who is in voice but has no running session"""
+        if not member.voice or member.voice.afk:
+            return
+        self.start_voice_session(str(member.id), datetime.datetime.now().timestamp())
         
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
         user_id = str(member.id)
         current_time = datetime.datetime.now().timestamp()
         
-        # Ignore AFK channel
-        if after.channel and after.channel.afk:
-            return
-            
-        # User joined a voice channel
-        if not before.channel and after.channel:
-            self.voice_start[user_id] = current_time
-            self.voice_time[user_id] = 0
+        # Time in the AFK channel doesn't count
+        was_active = before.channel is not None and not before.afk
+        is_active = after.channel is not None and not after.afk
+        
+        # Joined voice, or came back from AFK
+        if is_active and not was_active:
+            self.start_voice_session(user_id, current_time)
             
-        # User left a voice channel
-        elif before.channel and not after.channel:
-            if user_id in self.voice_start:
-                # Calculate time spent
-                time_spent = current_time - self.voice_start[user_id]
-                
-                # Update voice data
-                voice_users = await self.get_voice_data()
-                await self.check_voice_user(member)
-                
-                # Add time spent to total
-                voice_users[user_id]["voice_time"] = voice_users[user_id].get("voice_time", 0) + time_spent
-                
-                # Save voice data
-                with open('data/voice_levels.json', 'w') as f:
-                    json.dump(voice_users, f)
-                    
-                # Clean up tracking
-                del self.voice_start[user_id]
-                del self.voice_time[user_id]
-                
-        # User switched channels
-        elif before.channel and after.channel and before.channel != after.channel:
-            # If moving to AFK, count it as leaving
-            if after.channel.afk:
-                if user_id in self.voice_start:
-                    time_spent = current_time - self.voice_start[user_id]
-                    voice_users = await self.get_voice_data()
-                    await self.check_voice_user(member)
-                    
-                    voice_users[user_id]["voice_time"] = voice_users[user_id].get("voice_time", 0) + time_spent
-                    
-                    with open('data/voice_levels.json', 'w') as f:
-                        json.dump(voice_users, f)
-                    del self.voice_start[user_id]
-                    del self.voice_time[user_id]
-            # If moving from AFK to normal channel, count as joining
-            elif before.channel.afk and not after.channel.afk:
-                self.voice_start[user_id] = current_time
-                self.voice_time[user_id] = 0
+        # Left voice, or moved to AFK
+        elif was_active and not is_active:
+            self.end_voice_session(user_id, current_time)
         
     async def add_xp(self, user, channel):
         # Anti-spam mechanism (max 60 messages per minute)
         user_id = str(user.id)
         current_time = datetime.datetime.now().timestamp()
         
-        # Initialize tracking for new users
-        if user_id not in self.message_count:
-            self.message_count[user_id] = 0
-            self.window_start[user_id] = current_time
-        
-        # Check if 60 seconds have passed, reset if true
-        if current_time - self.window_start[user_id] > 60:
-            self.message_count[user_id] = 0
-            self.window_start[user_id] = current_time
-        
-        # Increment message count and check if under limit
-        self.message_count[user_id] += 1
-        if self.message_count[user_id] > 60:
+        if not self.xp_limiter.allow(user_id):
             return  # Over rate limit, don't add XP
                 
         # Add XP with some randomness
@@ -141,9 +171,9 @@ class LevelsCog(commands.Cog):
         if xp_gained < 5:
             xp_gained = 5  # Minimum XP gain
             
-        # Get current user data
-        users = await self.get_levels_data()
+        # Get current user data (in memory, nothing is read from disk here)
         await self.check_user(user)
+        users = self.levels.data
         
         # Get current level
         current_level = users[user_id]["level"]
@@ -163,9 +193,9 @@ class LevelsCog(commands.Cog):
         users[user_id]["total_messages"] += 1
         users[user_id]["last_message"] = current_time
         
-        # Save data
-        with open('data/levels.json', 'w') as f:
-            json.dump(users, f)
+        # Queue the change, it gets written with the next batch
+        self.levels.mark_dirty(user_id)
+        self.level_rank.update(user_id, (users[user_id]["level"], new_xp))
             
         # Send level up message if user leveled up
         if level_up and channel:
@@ -187,9 +217,7 @@ class LevelsCog(commands.Cog):
         await self.update_voice_time(member)
             
         await self.check_user(member)
-        await self.check_voice_user(member)
         users = await self.get_levels_data()
-        voice_users = await self.get_voice_data()
         user_id = str(member.id)
         
         # Get message data
@@ -197,8 +225,8 @@ class LevelsCog(commands.Cog):
         level = users[user_id]["level"]
         total_messages = users[user_id]["total_messages"]
         
-        # Get voice data
-        voice_time = voice_users[user_id]["voice_time"]
+        # Get voice data (live, including the running session)
+        voice_time = self.voice_total(user_id)
         
         # Calculate message progress to next level
         xp_for_current_level = level * self.xp_per_level
@@ -225,10 +253,14 @@ class LevelsCog(commands.Cog):
         embed.add_field(name="Level", value=f"**{level}**", inline=True)
         embed.add_field(name="Total XP", value=f"**{xp}**", inline=True)
         embed.add_field(name="Messages", value=f"**{total_messages}**", inline=True)
+        embed.add_field(name="Rank", value=f"**#{self.level_rank.rank(user_id)}** of {len(self.level_rank)}", inline=True)
         embed.add_field(name=f"Progress to Level {level+1}", value=f"{progress_bar} **{percentage}%**\n{current_level_xp}/{needed_for_next_level} XP", inline=False)
         
         # Voice stats
         embed.add_field(name="Time in Voice", value=f"**{voice_time_str}**", inline=True)
+        voice_rank = self.voice_rank.rank(user_id)
+        if voice_rank:
+            embed.add_field(name="Voice Rank", value=f"**#{voice_rank}** of {len(self.voice_rank)}", inline=True)
         
         embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
         embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
@@ -245,44 +277,43 @@ class LevelsCog(commands.Cog):
     @commands.command(aliases=["lvltop"])
     async def levels(self, ctx, page: int = 1):
         """Show the server's message level leaderboard"""
-        # Get all user data from the database file directly
-        users = await self.get_levels_data()
+        embed, page, total_pages = await self.build_level_leaderboard(ctx, page)
         
-        # Create list from all users in the database
-        user_list = []
+        # Create view with pagination buttons
+        view = LevelLeaderboardView(self, ctx, page, total_pages, board="level")
         
-        # First, add all existing database entries
-        for user_id, user_data in users.items():
-            try:
-                # Try to get the member object, fetch from Discord if needed
-                member = ctx.guild.get_member(int(user_id))
-                
-                # Include all users in the database
-                if 'xp' in user_data:
-                    # Get user data
-                    user_entry = {
-                        "id": user_id,
-                        "xp": user_data["xp"],
-                        "level": user_data["level"],
-                        "total_messages": user_data["total_messages"],
-                        "member": member
-                    }
-                    user_list.append(user_entry)
-            except Exception as e:
-                # Skip problematic entries
-                continue
+        # Send embed with view
+        view.message = await ctx.send(embed=embed, view=view)
+
+    @commands.command(aliases=["voicetop", "vtop"])
+    async def voicelevels(self, ctx, page: int = 1):
+        """Show the server's voice time leaderboard"""
+        # Bring every running voice session up to date in one pass
+        try:
+            await self.reconcile_voice(self.client.guilds)
+        except Exception as e:
+            print(f"Error reconciling voice sessions: {e}")
         
-        # Sort by level first, then by XP (both descending)
-        user_list.sort(key=lambda x: (x["level"], x["xp"]), reverse=True)
+        embed, page, total_pages = await self.build_voice_leaderboard(ctx, page)
+        
+        # Create view with pagination buttons
+        view = LevelLeaderboardView(self, ctx, page, total_pages, board="voice")
+        
+        # Send embed with view
+        view.message = await ctx.send(embed=embed, view=view)
+
+    async def build_level_leaderboard(self, ctx, page):
+        """Build one page of the message level leaderboard, returns (embed, page, total_pages)"""
+        # Users are kept sorted by level, then XP, so only this page is looked at
+        ranking = self.level_rank
         
         # Paginate results (10 per page)
-        total_pages = max(1, math.ceil(len(user_list) / 10))
+        total_pages = max(1, math.ceil(len(ranking) / 10))
         
         # Ensure page is within valid range
         page = max(1, min(page, total_pages))
         
         start_idx = (page - 1) * 10
-        end_idx = min(start_idx + 10, len(user_list))
         
         # Create embed
         embed = discord.Embed(
@@ -292,37 +323,26 @@ class LevelsCog(commands.Cog):
         )
         
         # Add leaderboard entries
-        if not user_list:
+        if not len(ranking):
             embed.description = "No users have earned XP yet! Send some messages to start gaining levels."
         else:
             # Get rank emojis for top 3
             rank_emoji = {0: "🥇", 1: "🥈", 2: "🥉"}
             
-            for idx, user_data in enumerate(user_list[start_idx:end_idx], start=start_idx + 1):
-                member = user_data["member"]
-                user_id = user_data["id"]
-                position = idx - 1 + start_idx  # Zero-based position
-                
-                # Get appropriate emoji based on rank
-                prefix = rank_emoji.get(position, f"{idx}.")
+            rows = ranking.page(page)
+            # Resolve every name on the page at once instead of one fetch per row
+            profiles = await profile_cache.resolve_many(self.client, ctx.guild, [user_id for user_id, _ in rows])
+            
+            for position, (user_id, score) in enumerate(rows, start=start_idx):
+                # Get appropriate emoji based on rank (position is zero-based)
+                prefix = rank_emoji.get(position, f"{position + 1}.")
                 
                 # Get the name and icon url
-                if member:
-                    name = member.name
-                    icon_url = member.avatar.url if member.avatar else member.default_avatar.url
-                else:
-                    # Try to fetch user info from Discord
-                    try:
-                        user = await self.client.fetch_user(int(user_id))
-                        name = user.name
-                        icon_url = user.avatar.url if user.avatar else user.default_avatar.url
-                    except:
-                        # If all else fails, use a generic name
-                        name = f"User-{user_id[-4:]}"
-                        icon_url = None
+                name, icon_url = profiles[user_id]
                 
                 # Create embed field
                 field_name = f"{prefix} {name}"
+                user_data = self.levels.data[user_id]
                 field_value = f"Level: **{user_data['level']}** | XP: **{user_data['xp']}**\nMessages: **{user_data['total_messages']}**"
                 
                 embed.add_field(name=field_name, value=field_value, inline=False)
@@ -335,85 +355,24 @@ class LevelsCog(commands.Cog):
                          icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
         embed.timestamp = datetime.datetime.utcnow()
         
-        # Create view with pagination buttons
-        view = LevelLeaderboardView(self, ctx, page, total_pages)
-        
-        # Send embed with view
-        view.message = await ctx.send(embed=embed, view=view)
+        return embed, page, total_pages
 
-    @commands.command(aliases=["voicetop", "vtop"])
-    async def voicelevels(self, ctx, page: int = 1):
-        """Show the server's voice time leaderboard"""
-        # Update voice time for all users in voice
-        for member in ctx.guild.members:
-            if member.voice and not member.voice.afk:
-                try:
-                    # If user is in voice but not being tracked, start tracking them
-                    user_id = str(member.id)
-                    if user_id not in self.voice_start:
-                        current_time = datetime.datetime.now().timestamp()
-                        self.voice_start[user_id] = current_time
-                        self.voice_time[user_id] = 0
-                        # Create user entry in voice data
-                        await self.check_voice_user(member)
-                    # Update their current time
-                    await self.update_voice_time(member)
-                except Exception as e:
-                    print(f"Error updating voice time for {member.name}: {e}")
-                    continue
-        
-        # Get all user data from the database file directly
-        users = await self.get_voice_data()
-        
-        # Create list from all users in the database
-        user_list = []
-        
-        # First, add all existing database entries
-        for user_id, user_data in users.items():
-            try:
-                # Try to get the member object, fetch from Discord if needed
-                member = ctx.guild.get_member(int(user_id))
-                
-                # Skip if member not found in guild
-                if not member:
-                    continue
-                
-                # Format voice time
-                voice_time = user_data.get("voice_time", 0)
-                
-                # If user is currently in voice, add their current session time
-                if member and member.voice and not member.voice.afk and user_id in self.voice_start:
-                    current_time = datetime.datetime.now().timestamp()
-                    current_session = current_time - self.voice_start[user_id]
-                    voice_time += current_session
-                
-                hours = int(voice_time / 3600)
-                minutes = int((voice_time % 3600) / 60)
-                voice_time_str = f"{hours}h {minutes}m"
-                
-                # Get user data
-                user_entry = {
-                    "id": user_id,
-                    "voice_time": voice_time,
-                    "voice_time_str": voice_time_str,
-                    "member": member
-                }
-                user_list.append(user_entry)
-            except Exception as e:
-                print(f"Error processing user {user_id}: {e}")
-                continue
+    async def build_voice_leaderboard(self, ctx, page):
+        """Build one page of the voice time leaderboard, returns (embed, page, total_pages)"""
+        # Fold running sessions in so the order and times are current
+        current_time = datetime.datetime.now().timestamp()
+        self.checkpoint_voice(current_time)
         
-        # Sort by voice time (descending)
-        user_list.sort(key=lambda x: x["voice_time"], reverse=True)
+        # Users are kept sorted by voice time, so only this page is looked at
+        ranking = self.voice_rank
         
         # Paginate results (10 per page)
-        total_pages = max(1, math.ceil(len(user_list) / 10))
+        total_pages = max(1, math.ceil(len(ranking) / 10))
         
         # Ensure page is within valid range
         page = max(1, min(page, total_pages))
         
         start_idx = (page - 1) * 10
-        end_idx = min(start_idx + 10, len(user_list))
         
         # Create embed
         embed = discord.Embed(
@@ -423,38 +382,28 @@ class LevelsCog(commands.Cog):
         )
         
         # Add leaderboard entries
-        if not user_list:
+        if not len(ranking):
             embed.description = "No users have spent time in voice channels yet!"
         else:
             # Get rank emojis for top 3
             rank_emoji = {0: "🥇", 1: "🥈", 2: "🥉"}
             
-            for idx, user_data in enumerate(user_list[start_idx:end_idx], start=start_idx + 1):
-                member = user_data["member"]
-                user_id = user_data["id"]
-                position = idx - 1 + start_idx  # Zero-based position
-                
-                # Get appropriate emoji based on rank
-                prefix = rank_emoji.get(position, f"{idx}.")
+            rows = ranking.page(page)
+            # Resolve every name on the page at once instead of one fetch per row
+            profiles = await profile_cache.resolve_many(self.client, ctx.guild, [user_id for user_id, _ in rows])
+            
+            for position, (user_id, score) in enumerate(rows, start=start_idx):
+                # Get appropriate emoji based on rank (position is zero-based)
+                prefix = rank_emoji.get(position, f"{position + 1}.")
                 
                 # Get the name and icon url
-                if member:
-                    name = member.name
-                    icon_url = member.avatar.url if member.avatar else member.default_avatar.url
-                else:
-                    # Try to fetch user info from Discord
-                    try:
-                        user = await self.client.fetch_user(int(user_id))
-                        name = user.name
-                        icon_url = user.avatar.url if user.avatar else user.default_avatar.url
-                    except:
-                        # If all else fails, use a generic name
-                        name = f"User-{user_id[-4:]}"
-                        icon_url = None
+                name, icon_url = profiles[user_id]
                 
                 # Create embed field
                 field_name = f"{prefix} {name}"
-                field_value = f"Time in Voice: **{user_data['voice_time_str']}**"
+                hours = int(score / 3600)
+                minutes = int((score % 3600) / 60)
+                field_value = f"Time in Voice: **{hours}h {minutes}m**"
                 
                 embed.add_field(name=field_name, value=field_value, inline=False)
                 
@@ -466,12 +415,8 @@ class LevelsCog(commands.Cog):
                          icon_url=ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url)
         embed.timestamp = datetime.datetime.utcnow()
         
-        # Create view with pagination buttons
-        view = LevelLeaderboardView(self, ctx, page, total_pages)
-        
-        # Send embed with view
-        view.message = await ctx.send(embed=embed, view=view)
-        
+        return embed, page, total_pages
+
     async def check_user(self, user):
         """Check if user exists in database, create if not"""
         users = await self.get_levels_data()
@@ -485,85 +430,27 @@ class LevelsCog(commands.Cog):
                 "last_message": 0
             }
             
-            # Save updated data
-            with open('data/levels.json', 'w') as f:
-                json.dump(users, f)
+            self.levels.mark_dirty(user_id)
+            self.level_rank.update(user_id, (0, 0))
                 
         return True
         
     async def get_levels_data(self):
-        """Get level data from JSON file"""
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        
-        if not os.path.exists('data/levels.json'):
-            with open('data/levels.json', 'w') as f:
-                json.dump({}, f)
-
-        with open('data/levels.json', 'r') as f:
-            content = f.read().strip()
-            if not content:
-                users = {}
-            else:
-                try:
-                    users = json.loads(content)
-                except json.JSONDecodeError:
-                    users = {}
-            
-        if not content:
-            with open('data/levels.json', 'w') as f:
-                json.dump(users, f)
-                
-        return users
+        """Get level data, including XP gains that haven't been written yet"""
+        return self.levels.data
 
     async def get_voice_data(self):
-        """Get voice level data from JSON file"""
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        
-        if not os.path.exists('data/voice_levels.json'):
-            with open('data/voice_levels.json', 'w') as f:
-                json.dump({}, f)
-
-        with open('data/voice_levels.json', 'r') as f:
-            content = f.read().strip()
-            if not content:
-                users = {}
-            else:
-                try:
-                    users = json.loads(content)
-                except json.JSONDecodeError:
-                    users = {}
-            
-        if not content:
-            with open('data/voice_levels.json', 'w') as f:
-                json.dump(users, f)
-                
-        return users
-
-    async def check_voice_user(self, user):
-        """Check if user exists in voice database, create if not"""
-        users = await self.get_voice_data()
-        user_id = str(user.id)
-        
-        if user_id not in users:
-            users[user_id] = {
-                "voice_time": 0
-            }
-            
-            # Save updated data
-            with open('data/voice_levels.json', 'w') as f:
-                json.dump(users, f)
-                
-        return True
+        """Get voice level data as of the last checkpoint or finished session"""
+        return self.voice.data
 
 class LevelLeaderboardView(discord.ui.View):
-    def __init__(self, cog, ctx, page, total_pages):
+    def __init__(self, cog, ctx, page, total_pages, board="level"):
         super().__init__(timeout=60)
         self.cog = cog
         self.ctx = ctx
         self.page = page
         self.total_pages = total_pages
+        self.board = board  # "level" or "voice"
         
         # Add previous page button if not on first page
         if page > 1:
@@ -604,105 +491,14 @@ class LevelLeaderboardView(discord.ui.View):
             pass
 
     async def update_page(self, new_page: int):
-        # Get all user data from database 
-        users = await self.cog.get_levels_data()
-        
-        # Create list from all users in the database
-        user_list = []
-        
-        # Add all existing database entries
-        for user_id, user_data in users.items():
-            try:
-                # Try to get the member object
-                member = self.ctx.guild.get_member(int(user_id))
-                
-                # Include all users in the database
-                if 'xp' in user_data:
-                    # Get user data
-                    voice_time = user_data.get("voice_time", 0)
-                    hours = int(voice_time / 3600)
-                    minutes = int((voice_time % 3600) / 60)
-                    voice_time_str = f"{hours}h {minutes}m"
-                    
-                    user_entry = {
-                        "id": user_id,
-                        "xp": user_data["xp"],
-                        "level": user_data["level"],
-                        "total_messages": user_data["total_messages"],
-                        "voice_time": voice_time,
-                        "voice_time_str": voice_time_str,
-                        "member": member
-                    }
-                    user_list.append(user_entry)
-            except Exception as e:
-                # Skip problematic entries
-                continue
-        
-        # Sort by level first, then by XP (both descending)
-        user_list.sort(key=lambda x: (x["level"], x["xp"]), reverse=True)
-        
-        # Paginate results (10 per page)
-        total_pages = max(1, math.ceil(len(user_list) / 10))
-        
-        # Ensure page is within valid range
-        new_page = max(1, min(new_page, total_pages))
-        
-        start_idx = (new_page - 1) * 10
-        end_idx = min(start_idx + 10, len(user_list))
-        
-        # Create embed
-        embed = discord.Embed(
-            title=f"🏆 Level Leaderboard",
-            description=f"Top members ranked by level and XP.",
-            color=discord.Color.gold()
-        )
-        
-        # Add leaderboard entries
-        if not user_list:
-            embed.description = "No users have earned XP yet! Send some messages to start gaining levels."
+        if self.board == "voice":
+            build = self.cog.build_voice_leaderboard
         else:
-            # Get rank emojis for top 3
-            rank_emoji = {0: "🥇", 1: "🥈", 2: "🥉"}
-            
-            for idx, user_data in enumerate(user_list[start_idx:end_idx], start=start_idx + 1):
-                member = user_data["member"]
-                user_id = user_data["id"]
-                position = idx - 1 + start_idx  # Zero-based position
-                
-                # Get appropriate emoji based on rank
-                prefix = rank_emoji.get(position, f"{idx}.")
-                
-                # Get the name and icon url
-                if member:
-                    name = member.name
-                    icon_url = member.avatar.url if member.avatar else member.default_avatar.url
-                else:
-                    # Try to fetch user info from Discord
-                    try:
-                        user = await self.cog.client.fetch_user(int(user_id))
-                        name = user.name
-                        icon_url = user.avatar.url if user.avatar else user.default_avatar.url
-                    except:
-                        # If all else fails, use a generic name
-                        name = f"User-{user_id[-4:]}"
-                        icon_url = None
-                
-                # Create embed field
-                field_name = f"{prefix} {name}"
-                field_value = f"Level: **{user_data['level']}** | XP: **{user_data['xp']}**\nMessages: **{user_data['total_messages']}** | Voice: **{user_data['voice_time_str']}**"
-                
-                embed.add_field(name=field_name, value=field_value, inline=False)
-                
-                # Show first-place user as thumbnail
-                if position == 0 and icon_url:
-                    embed.set_thumbnail(url=icon_url)
-        
-        embed.set_footer(text=f"Page {new_page}/{total_pages} • Requested by {self.ctx.author.name}", 
-                         icon_url=self.ctx.author.avatar.url if self.ctx.author.avatar else self.ctx.author.default_avatar.url)
-        embed.timestamp = datetime.datetime.utcnow()
+            build = self.cog.build_level_leaderboard
+        embed, new_page, total_pages = await build(self.ctx, new_page)
         
         # Create new view with updated page
-        new_view = LevelLeaderboardView(self.cog, self.ctx, new_page, total_pages)
+        new_view = LevelLeaderboardView(self.cog, self.ctx, new_page, total_pages, board=self.board)
         new_view.message = self.message
         
         # Update the message
@@ -0,0 +1,74 @@
+import storage
+
+
+class LinkRegistry:
+    """Discord user id -> Last.fm username links, loaded once and kept in memory.
+
+    Changes are written through to the "lastfm" collection right away (the JSON
+    backend replaces the file atomically). A reverse index from Last.fm username to
+    Discord ids answers "who linked this account" in O(1); Last.fm usernames are
+    case-insensitive, so it is keyed on the casefolded name.
+    """
+
+    def __init__(self):
+        self.links = {}  # discord id (str) -> Last.fm username
+        self.owners = {}  # casefolded Last.fm username -> discord ids (str)
+        self.loaded = False
+
+    @staticmethod
+    def key(username):
+        return username.casefold()
+
+    def __len__(self):
+        return len(self.links)
+
+    async def load(self):
+        self.links = await storage.load("lastfm")
+        self.owners = {}
+        for user_id, username in self.links.items():
+            self.owners.setdefault(self.key(username), set()).add(user_id)
+        self.loaded = True
+        return self.links
+
+    def get(self, user_id):
+        return self.links.get(str(user_id))
+
+    def linked_to(self, username):
+        """Discord ids that linked a Last.fm account"""
+        return self.owners.get(self.key(username), set())
+
+    def usernames(self):
+        return list(self.links.values())
+
+    def items(self):
+        return list(self.links.items())
+
+    def _drop_owner(self, user_id, username):
+        owners = self.owners.get(self.key(username))
+        if owners is not None:
+            owners.discard(user_id)
+            if not owners:
+                del self.owners[self.key(username)]
+
+    async def link(self, user_id, username):
+        user_id = str(user_id)
+        old = self.links.get(user_id)
+        if old is not None:
+            self._drop_owner(user_id, old)
+        self.links[user_id] = username
+        self.owners.setdefault(self.key(username), set()).add(user_id)
+        await self._save(user_id)
+
+    async def unlink(self, user_id):
+        """Remove a link, returns the username that was linked or None"""
+        user_id = str(user_id)
+        username = self.links.pop(user_id, None)
+        if username is None:
+            return None
+        self._drop_owner(user_id, username)
+        await self._save(user_id)
+        return username
+
+    async def _save(self, user_id):
+        # Copied now, so the I/O thread writes exactly this state
+        await storage.save("lastfm", dict(self.links), [user_id])
@@ -11,6 +11,7 @@ from jobs import JobMarketCog
 from levels import LevelsCog
 from admin import AdminCog
 from lastfm import LastFMCog
+from bank import bank_store
 
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -65,7 +66,17 @@ async def on_ready():
     print('Bot is ready.')
     print(f'Logged in as {client.user.name}')
 
+async def run(token):
+    async with client:
+        try:
+            await client.start(token)
+        finally:
+            # Fold the bank journal into a snapshot before exiting
+            await bank_store.close()
+
 async def setup():
+    # Runs inside the bot's own event loop, so background tasks started here stay alive
+    await bank_store.start()
     try:
         await client.add_cog(EconomyCog(client))
         await client.add_cog(GamblingCog(client))
@@ -84,7 +95,8 @@ if __name__ == "__main__":
     
     if token:
         import asyncio
-        asyncio.run(setup())
-        client.run(token)
+        discord.utils.setup_logging()
+        client.setup_hook = setup
+        asyncio.run(run(token))
     else:
         print("Error: Bot token not found.")
\ No newline at end of file
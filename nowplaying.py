@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import random
+import time
+
+from ratelimit import AsyncTokenBucket
+
+
+class NowPlayingPoller:
+    """Keeps a snapshot of what every linked Last.fm account is playing.
+
+    Each username is polled on its own schedule: every ``playing_interval`` seconds
+    while it is playing something and every ``idle_interval`` seconds otherwise, with
+    some jitter so polls stay spread out instead of bunching up. All polls share a
+    budget of ``budget`` requests per second, which leaves the rest of the API rate for
+    commands. With more users than the budget covers, polls run late rather than faster.
+
+    ``fetch(username)`` returns the user's current track as a dict, or None.
+    """
+
+    def __init__(self, fetch, playing_interval=30, idle_interval=180, budget=1.0,
+                 concurrency=4, timeout=10):
+        self.fetch = fetch
+        self.playing_interval = playing_interval
+        self.idle_interval = idle_interval
+        self.budget = AsyncTokenBucket(budget, max(1, budget))
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.snapshot = {}  # username -> (track or None, checked at)
+        self._due = {}  # username -> next poll time, only for users being polled
+        self._queue = []  # heap of (due, username), stale entries are skipped
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()  # poll tasks in progress
+        self.polls = 0
+        self.errors = 0
+
+    def sync(self, usernames):
+        """Poll exactly these usernames, new ones right away"""
+        usernames = set(usernames)
+        for username in list(self._due):
+            if username not in usernames:
+                del self._due[username]
+                self.snapshot.pop(username, None)
+        now = time.monotonic()
+        for username in usernames - self._due.keys():
+            self._schedule(username, now)
+
+    def record(self, username, track, checked=None):
+        """Store a result fetched elsewhere and push the next poll back accordingly"""
+        self.snapshot[username] = (track, time.time() if checked is None else checked)
+        if username in self._due:
+            self._schedule(username, time.monotonic() + self._interval(track))
+
+    def _interval(self, track):
+        interval = self.playing_interval if track else self.idle_interval
+        return interval * random.uniform(0.8, 1.2)
+
+    def _schedule(self, username, due):
+        self._due[username] = due
+        heapq.heappush(self._queue, (due, username))
+        self._wakeup.set()  # the poll loop may be sleeping until a later entry
+
+    async def _poll(self, username):
+        try:
+            track = await asyncio.wait_for(self.fetch(username), self.timeout)
+        except Exception as e:
+            # Keep the last known state, it is still the best guess
+            self.errors += 1
+            print(f"Error polling now playing for {username}: {e}")
+            if username in self._due:
+                self._schedule(username, time.monotonic() + self._interval(None))
+            return
+        self.polls += 1
+        if username in self._due:
+            self.record(username, track)
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def poll(username):
+            try:
+                await self._poll(username)
+            finally:
+                slots.release()
+
+        while True:
+            # Drop heap entries that were rescheduled or belong to unlinked users
+            while self._queue and self._due.get(self._queue[0][1]) != self._queue[0][0]:
+                heapq.heappop(self._queue)
+
+            now = time.monotonic()
+            if not self._queue or self._queue[0][0] > now:
+                delay = self._queue[0][0] - now if self._queue else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due, username = heapq.heappop(self._queue)
+            await slots.acquire()
+            await self.budget.acquire()
+            if self._due.get(username) != due:
+                # Rescheduled or unlinked while we waited for the budget
+                slots.release()
+                continue
+            # Parked until the poll reschedules it
+            self._due[username] = float("inf")
+            task = asyncio.create_task(poll(username))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    def start(self, usernames=()):
+        self.sync(usernames)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+
+    def playing(self, usernames):
+        """(username, track, checked at) for those of ``usernames`` playing something"""
+        result = []
+        for username in usernames:
+            track, checked = self.snapshot.get(username, (None, None))
+            if track:
+                result.append((username, track, checked))
+        return result
+
+    def stats(self):
+        return {
+            "tracked": len(self._due),
+            "playing": sum(1 for track, _ in self.snapshot.values() if track),
+            "polls": self.polls,
+            "errors": self.errors,
+        }
@@ -0,0 +1,59 @@
+import asyncio
+
+from cache import TTLCache
+
+
+class ProfileCache:
+    """Resolves user ids to (name, avatar url) for leaderboard rows.
+
+    Guild members come straight from the member cache. Everyone else is looked up
+    with ``fetch_user``: all misses of a page concurrently (at most ``concurrency``
+    requests at once) and the results kept for ``ttl`` seconds. Failed lookups are
+    remembered for a shorter time so deleted accounts don't cost a request per render.
+    """
+
+    def __init__(self, maxsize=5000, ttl=6 * 3600, failure_ttl=300, concurrency=5):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.failure_ttl = failure_ttl
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    @staticmethod
+    def _profile(user):
+        return user.name, user.avatar.url if user.avatar else user.default_avatar.url
+
+    async def _fetch(self, client, user_id):
+        async with self.semaphore:
+            try:
+                user = await client.fetch_user(int(user_id))
+            except Exception:
+                # If all else fails, use a generic name
+                profile = (f"User-{user_id[-4:]}", None)
+                self.cache.set(user_id, profile, ttl=self.failure_ttl)
+                return user_id, profile
+
+        profile = self._profile(user)
+        self.cache.set(user_id, profile)
+        return user_id, profile
+
+    async def resolve_many(self, client, guild, user_ids):
+        """Map each user id to (name, icon_url), fetching all unknown ones at once"""
+        profiles = {}
+        missing = []
+        for user_id in map(str, user_ids):
+            member = guild.get_member(int(user_id)) if guild else None
+            if member:
+                profiles[user_id] = self._profile(member)
+                continue
+
+            cached = self.cache.get(user_id)
+            if cached is not None:
+                profiles[user_id] = cached
+            else:
+                missing.append(user_id)
+
+        if missing:
+            profiles.update(await asyncio.gather(*(self._fetch(client, user_id) for user_id in missing)))
+        return profiles
+
+
+profile_cache = ProfileCache()
@@ -0,0 +1,78 @@
+from bisect import bisect_left, insort
+
+
+class RankIndex:
+    """Order-statistic index of scores per user, highest score first.
+
+    Keeps a sorted list of ``(negated score, user_id)`` keys next to a dict of current
+    scores. Ranks and page starts are found by binary search, so reading page K is
+    O(log n + page size) and a user's rank O(log n). An update is a binary search plus
+    a list insert/delete, which is a memmove and cheap at the sizes a server reaches.
+    Scores may be numbers or tuples of numbers (compared element by element).
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._scores = {}
+
+    @staticmethod
+    def _key(user_id, score):
+        if isinstance(score, tuple):
+            return tuple(-part for part in score) + (user_id,)
+        return (-score, user_id)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self._scores
+
+    def rebuild(self, scores):
+        """Replace the whole index from a user_id -> score mapping"""
+        self._scores = {str(user_id): score for user_id, score in scores.items()}
+        self._keys = sorted(self._key(user_id, score) for user_id, score in self._scores.items())
+
+    def update(self, user_id, score):
+        user_id = str(user_id)
+        old = self._scores.get(user_id)
+        if old == score and user_id in self._scores:
+            return
+        if user_id in self._scores:
+            del self._keys[bisect_left(self._keys, self._key(user_id, old))]
+        self._scores[user_id] = score
+        insort(self._keys, self._key(user_id, score))
+
+    def update_many(self, scores):
+        """Update several users from a user_id -> score mapping.
+
+        Every single update moves part of the list, so a large batch (a payout to
+        every account) re-sorts once instead.
+        """
+        if len(scores) < 64:
+            for user_id, score in scores.items():
+                self.update(user_id, score)
+            return
+        self._scores.update((str(user_id), score) for user_id, score in scores.items())
+        self._keys = sorted(self._key(user_id, score) for user_id, score in self._scores.items())
+
+    def remove(self, user_id):
+        user_id = str(user_id)
+        if user_id not in self._scores:
+            return
+        old = self._scores.pop(user_id)
+        del self._keys[bisect_left(self._keys, self._key(user_id, old))]
+
+    def score(self, user_id):
+        return self._scores.get(str(user_id))
+
+    def rank(self, user_id):
+        """1-based rank of a user, or None if they aren't ranked"""
+        user_id = str(user_id)
+        if user_id not in self._scores:
+            return None
+        return bisect_left(self._keys, self._key(user_id, self._scores[user_id])) + 1
+
+    def page(self, page, per_page=10):
+        """The (user_id, score) pairs on a 1-based page"""
+        start = (page - 1) * per_page
+        return [(key[-1], self._scores[key[-1]]) for key in self._keys[start:start + per_page]]
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class KeyedTokenBucket:
+    """One token bucket per key (e.g. per user) that forgets idle keys.
+
+    Each key may burst up to ``capacity`` and refills at ``rate`` tokens per second.
+    Buckets are kept in least-recently-seen order, so evicting keys idle for longer
+    than ``idle_ttl`` only ever looks at the front of the dict: O(1) amortized per
+    call, and memory stays proportional to the keys active within the TTL.
+    """
+
+    def __init__(self, rate, capacity, idle_ttl=600):
+        self.rate = rate
+        self.capacity = capacity
+        # An evicted bucket must be indistinguishable from a full one
+        self.idle_ttl = max(idle_ttl, capacity / rate)
+        self.buckets = OrderedDict()  # key -> (tokens, last_seen)
+        self.allowed = 0
+        self.throttled = 0
+        self.evicted = 0
+
+    def allow(self, key, cost=1, now=None):
+        """Take ``cost`` tokens from the key's bucket, returns False if it's empty"""
+        if now is None:
+            now = time.monotonic()
+
+        self.evict_idle(now)
+
+        bucket = self.buckets.pop(key, None)
+        if bucket is None:
+            tokens = self.capacity
+        else:
+            tokens, last_seen = bucket
+            tokens = min(self.capacity, tokens + (now - last_seen) * self.rate)
+
+        if tokens >= cost:
+            tokens -= cost
+            self.allowed += 1
+            allowed = True
+        else:
+            self.throttled += 1
+            allowed = False
+
+        self.buckets[key] = (tokens, now)  # re-inserted at the most recent end
+        return allowed
+
+    def evict_idle(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        cutoff = now - self.idle_ttl
+        while self.buckets:
+            key, (_, last_seen) = next(iter(self.buckets.items()))
+            if last_seen > cutoff:
+                break
+            del self.buckets[key]
+            self.evicted += 1
+
+    def stats(self):
+        return {
+            "tracked": len(self.buckets),
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "evicted": self.evicted,
+        }
+
+
+class AsyncTokenBucket:
+    """A single token bucket that callers wait on instead of being refused.
+
+    Refills at ``rate`` tokens per second up to ``capacity``. ``acquire`` sleeps until
+    enough tokens are available; waiters are served first come, first served.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.throttled = 0  # acquisitions that had to wait
+        self.waited = 0.0  # seconds spent waiting in total
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost=1):
+        async with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens < cost:
+                delay = (cost - self.tokens) / self.rate
+                self.throttled += 1
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._refill(time.monotonic())
+            self.tokens -= cost
+            self.acquired += 1
+
+    def stats(self):
+        return {
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "waited": self.waited,
+        }
@@ -0,0 +1,348 @@
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ratelimit import AsyncTokenBucket
+
+# Chart periods in seconds, None means all time
+PERIODS = {
+    "7d": 7 * 86400,
+    "30d": 30 * 86400,
+    "year": 365 * 86400,
+    "all": None,
+}
+PERIOD_ALIASES = {
+    "week": "7d", "7day": "7d", "7days": "7d",
+    "month": "30d", "30day": "30d", "30days": "30d",
+    "365d": "year", "12month": "year", "12months": "year",
+    "overall": "all", "alltime": "all",
+}
+PERIOD_NAMES = {"7d": "last 7 days", "30d": "last 30 days", "year": "last year", "all": "all time"}
+
+# Top lists: what is grouped together, and the all-time counts table for it
+KINDS = {
+    "artist": (("artist",), "artist_plays"),
+    "album": (("artist", "album"), "album_plays"),
+    "track": (("artist", "track"), "track_plays"),
+}
+
+
+# The mirror's own thread: a long GROUP BY or import must not hold up the storage
+# I/O thread, which keeps the bank journal in order
+scrobble_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scrobbles")
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking ScrobbleStore call on the scrobble thread"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(scrobble_executor, functools.partial(func, *args, **kwargs))
+
+
+def parse_period(text):
+    """Normalize a period argument ("7d", "month", ...), returns None if it isn't one"""
+    if text is None:
+        return "all"
+    text = text.lower()
+    text = PERIOD_ALIASES.get(text, text)
+    return text if text in PERIODS else None
+
+
+class ScrobbleStore:
+    """Local mirror of linked users' scrobbles in SQLite.
+
+    Every scrobble is one row in ``scrobbles``. All-time play counts per artist, album
+    and track are kept in their own tables, updated in the same transaction as the
+    inserts, so all-time tops never scan the raw history. Time-bounded tops use the
+    (username, played_at) index and only read the rows inside the period.
+
+    The methods here block and are meant to run on the scrobble thread (``run_db``).
+    """
+
+    def __init__(self, path='data/scrobbles.db'):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS scrobbles (
+                    username TEXT NOT NULL,
+                    played_at INTEGER NOT NULL,
+                    artist TEXT NOT NULL,
+                    album TEXT NOT NULL,
+                    track TEXT NOT NULL,
+                    image TEXT,
+                    PRIMARY KEY (username, played_at, artist, track)
+                );
+                CREATE TABLE IF NOT EXISTS artist_plays (
+                    username TEXT NOT NULL, artist TEXT NOT NULL, plays INTEGER NOT NULL,
+                    PRIMARY KEY (username, artist)
+                );
+                CREATE TABLE IF NOT EXISTS album_plays (
+                    username TEXT NOT NULL, artist TEXT NOT NULL, album TEXT NOT NULL,
+                    plays INTEGER NOT NULL, image TEXT,
+                    PRIMARY KEY (username, artist, album)
+                );
+                CREATE TABLE IF NOT EXISTS track_plays (
+                    username TEXT NOT NULL, artist TEXT NOT NULL, track TEXT NOT NULL,
+                    plays INTEGER NOT NULL,
+                    PRIMARY KEY (username, artist, track)
+                );
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    username TEXT PRIMARY KEY,
+                    last_played INTEGER NOT NULL,
+                    synced_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS artist_plays_artist ON artist_plays (artist);
+            """)
+
+    def sync_state(self, username):
+        """(timestamp of the newest mirrored scrobble, when the last sync finished), or None"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT last_played, synced_at FROM sync_state WHERE username = ?", (username,)
+            ).fetchone()
+
+    def add_scrobbles(self, username, scrobbles, last_played, synced_at=None):
+        """Insert (played_at, artist, album, track, image) rows and bump the play counts.
+
+        ``last_played`` becomes the user's sync position in the same transaction, returns
+        the scrobbles that weren't mirrored yet. ``synced_at`` is only written when given
+        (the import caught up); otherwise the previous value stays, so 0 always means
+        no import has ever completed.
+        """
+        added = []
+        with self.lock, self.conn:
+            for played_at, artist, album, track, image in scrobbles:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO scrobbles VALUES (?, ?, ?, ?, ?, ?)",
+                    (username, played_at, artist, album, track, image),
+                )
+                if not cursor.rowcount:
+                    continue  # already mirrored, don't count it twice
+                added.append((played_at, artist, album, track, image))
+                self.conn.execute(
+                    "INSERT INTO artist_plays VALUES (?, ?, 1) "
+                    "ON CONFLICT (username, artist) DO UPDATE SET plays = plays + 1",
+                    (username, artist),
+                )
+                if album:
+                    self.conn.execute(
+                        "INSERT INTO album_plays VALUES (?, ?, ?, 1, ?) "
+                        "ON CONFLICT (username, artist, album) DO UPDATE SET plays = plays + 1, "
+                        "image = COALESCE(excluded.image, image)",
+                        (username, artist, album, image),
+                    )
+                self.conn.execute(
+                    "INSERT INTO track_plays VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (username, artist, track) DO UPDATE SET plays = plays + 1",
+                    (username, artist, track),
+                )
+            self.conn.execute(
+                "INSERT INTO sync_state VALUES (?, ?, COALESCE(?, 0)) "
+                "ON CONFLICT (username) DO UPDATE SET last_played = MAX(last_played, excluded.last_played), "
+                "synced_at = COALESCE(?, synced_at)",
+                (username, last_played, synced_at, synced_at),
+            )
+        return added
+
+    def top(self, username, kind="artist", since=None, limit=10):
+        """Most played artists/albums/tracks as (names..., plays[, image]) rows"""
+        columns, counts_table = KINDS[kind]
+        names = ", ".join(columns)
+        image = ", image" if kind == "album" else ""
+        with self.lock:
+            if since is None:
+                return self.conn.execute(
+                    f"SELECT {names}, plays{image} FROM {counts_table} WHERE username = ? "
+                    f"ORDER BY plays DESC LIMIT ?",
+                    (username, limit),
+                ).fetchall()
+            not_empty = " AND album != ''" if kind == "album" else ""
+            return self.conn.execute(
+                f"SELECT {names}, COUNT(*) AS plays{', MAX(image)' if image else ''} FROM scrobbles "
+                f"WHERE username = ? AND played_at >= ?{not_empty} "
+                f"GROUP BY {names} ORDER BY plays DESC LIMIT ?",
+                (username, since, limit),
+            ).fetchall()
+
+    def artist_plays(self):
+        """Every (username, artist, plays) row of the all-time artist counts"""
+        with self.lock:
+            return self.conn.execute("SELECT username, artist, plays FROM artist_plays").fetchall()
+
+    def forget(self, username):
+        """Drop everything mirrored for a user"""
+        with self.lock, self.conn:
+            for table in ("scrobbles", "artist_plays", "album_plays", "track_plays", "sync_state"):
+                self.conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ScrobbleSync:
+    """Keeps a ScrobbleStore up to date from ``user.getRecentTracks``.
+
+    A sync asks only for scrobbles after the newest one already mirrored (``from``)
+    and up to the moment the sync started (``to``), so the pages stay put while new
+    scrobbles arrive. Pages are imported oldest first and each one is committed with
+    the sync position, which makes an interrupted import resume where it stopped.
+    A single run imports at most ``max_pages`` pages, a long history takes a few runs.
+    Page requests share a budget of ``budget`` per second so imports never crowd out
+    commands.
+    """
+
+    def __init__(self, api, store, page_size=200, max_pages=50, interval=15 * 60, budget=1.0):
+        self.api = api
+        self.store = store
+        self.budget = AsyncTokenBucket(budget, max(1, budget))
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.interval = interval
+        self.usernames = set()
+        self._syncing = {}  # username -> task of the sync in progress
+        self._task = None
+        self.on_import = []  # callbacks called with (username, new scrobbles) after each page
+        self.pages = 0
+        self.imported = 0
+
+    async def _fetch_page(self, username, since, until, page):
+        await self.budget.acquire()
+        self.pages += 1
+        return await self.api.call("user.getRecentTracks", **self._page_params(username, since, until, page))
+
+    def _page_params(self, username, since, until, page):
+        return {
+            "user": username,
+            "limit": self.page_size,
+            "page": page,
+            "from": since + 1 if since else None,
+            "to": until,
+            "use_cache": False,
+        }
+
+    @staticmethod
+    def _parse(tracks):
+        scrobbles = []
+        for track in tracks:
+            date = track.get("date")
+            if not date:
+                continue  # the track playing right now isn't scrobbled yet
+            images = track.get("image") or []
+            image = images[-1].get("#text") if images else None
+            scrobbles.append((
+                int(date["uts"]),
+                track["artist"]["#text"],
+                track.get("album", {}).get("#text", ""),
+                track["name"],
+                image or None,
+            ))
+        return scrobbles
+
+    async def sync_user(self, username):
+        """Import new scrobbles of one user, returns how many were added"""
+        state = await run_db(self.store.sync_state, username)
+        since = state[0] if state else 0
+        until = int(time.time())
+
+        # The first page tells how many pages there are, they're newest first
+        first = await self._fetch_page(username, since, until, 1)
+        total_pages = int(first.get("recenttracks", {}).get("@attr", {}).get("totalPages", 0) or 0)
+        if total_pages == 0:
+            await run_db(self.store.add_scrobbles, username, [], since, time.time())
+            return 0
+
+        added = 0
+        last_page = min(total_pages, self.max_pages)
+        # Walk from the oldest page we'll import this run towards the newest one
+        for page in range(total_pages, total_pages - last_page, -1):
+            if page == 1:
+                data = first
+            else:
+                data = await self._fetch_page(username, since, until, page)
+            scrobbles = self._parse(data.get("recenttracks", {}).get("track", []))
+            if not scrobbles and page != 1:
+                continue
+            position = max([since] + [played_at for played_at, *_ in scrobbles])
+            # Mark as synced only once the newest page is in, older pages keep the old mark
+            synced_at = time.time() if page == 1 else None
+            new = await run_db(self.store.add_scrobbles, username, scrobbles, position, synced_at)
+            added += len(new)
+            for callback in self.on_import:
+                callback(username, new)
+
+        self.imported += added
+        return added
+
+    def request_sync(self, username):
+        """Start syncing a user in the background unless that's already happening"""
+        task = self._syncing.get(username)
+        if task is None or task.done():
+            task = asyncio.create_task(self._sync_logged(username))
+            self._syncing[username] = task
+        return task
+
+    async def _sync_logged(self, username):
+        try:
+            added = await self.sync_user(username)
+            if added:
+                print(f"Imported {added} scrobbles for {username}")
+            return added
+        except Exception as e:
+            print(f"Error syncing scrobbles for {username}: {e}")
+            return 0
+
+    def sync(self, usernames):
+        """Keep exactly these usernames mirrored, importing new ones right away.
+
+        Accounts that are no longer linked stop syncing and their history is deleted.
+        Returns the usernames that were dropped.
+        """
+        usernames = set(usernames)
+        for username in usernames - self.usernames:
+            self.request_sync(username)
+        dropped = self.usernames - usernames
+        for username in dropped:
+            task = self._syncing.pop(username, None)
+            if task is not None:
+                task.cancel()
+            # Queued behind any page the cancelled sync already handed to the thread
+            asyncio.create_task(self._forget_logged(username))
+        self.usernames = usernames
+        return dropped
+
+    async def _forget_logged(self, username):
+        try:
+            await run_db(self.store.forget, username)
+        except Exception as e:
+            print(f"Error deleting scrobbles for {username}: {e}")
+
+    def start(self, usernames=()):
+        self.usernames = set(usernames)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def _sync_loop(self):
+        while True:
+            for username in list(self.usernames):
+                await self.request_sync(username)
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._syncing.values():
+            task.cancel()
+        await run_db(self.store.close)
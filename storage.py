@@ -0,0 +1,418 @@
+import asyncio
+import copy
+import functools
+import json
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_json(path, default=None):
+    """Read a JSON file, returning ``default`` if it is missing, empty or corrupt"""
+    if default is None:
+        default = {}
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    if not os.path.exists(path):
+        return default
+
+    with open(path, 'r') as f:
+        content = f.read().strip()
+
+    if not content:
+        return default
+
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return default
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and swap it in, so a crash never leaves half a file"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# Collection name -> (file, key inside that file). jobs.json holds two collections.
+JSON_FILES = {
+    "bank": ('data/bank.json', None),
+    "levels": ('data/levels.json', None),
+    "voice": ('data/voice_levels.json', None),
+    "user_jobs": ('data/jobs.json', 'user_jobs'),
+    "current_jobs": ('data/jobs.json', 'current_jobs'),
+    "lastfm": ('data/lastfm.json', None),
+    "bank_marks": ('data/bank_marks.json', None),
+}
+
+
+class JsonBackend:
+    """The original storage: one JSON file per collection, rewritten as a whole"""
+
+    name = "json"
+    partial_writes = False  # save() always needs the full collection
+
+    def _read(self, collection, default):
+        path, key = JSON_FILES[collection]
+        data = read_json(path)
+        if key is None:
+            return data if data else default
+        return data.get(key, default) if isinstance(data, dict) else default
+
+    def _write(self, collection, value):
+        path, key = JSON_FILES[collection]
+        if key is not None:
+            data = read_json(path)
+            data[key] = value
+            value = data
+        write_json_atomic(path, value)
+
+    def load(self, collection):
+        return self._read(collection, {})
+
+    def get(self, collection, key):
+        return self.load(collection).get(str(key))
+
+    def save(self, collection, data, keys=None):
+        # A JSON file can only be rewritten as a whole, so ``keys`` is ignored
+        self._write(collection, data)
+
+    def load_document(self, name, default=None):
+        return self._read(name, default)
+
+    def save_document(self, name, value):
+        self._write(name, value)
+
+    def close(self):
+        pass
+
+
+class Table:
+    """Maps one keyed collection onto a SQLite table with a user_id primary key"""
+
+    def __init__(self, name, columns, scalar=None, json_columns=()):
+        self.name = name
+        self.columns = columns  # column -> SQL type
+        self.scalar = scalar  # set if each value is a single column instead of a dict
+        self.json_columns = json_columns
+
+        names = list(columns)
+        placeholders = ", ".join("?" for _ in range(len(names) + 1))
+        updates = ", ".join(f"{c} = excluded.{c}" for c in names)
+        self.create_sql = (
+            f"CREATE TABLE IF NOT EXISTS {name} (user_id TEXT PRIMARY KEY, "
+            + ", ".join(f"{c} {t}" for c, t in columns.items()) + ")"
+        )
+        self.select_sql = f"SELECT user_id, {', '.join(names)} FROM {name}"
+        self.get_sql = f"{self.select_sql} WHERE user_id = ?"
+        self.upsert_sql = (
+            f"INSERT INTO {name} (user_id, {', '.join(names)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(user_id) DO UPDATE SET {updates}"
+        )
+        self.delete_sql = f"DELETE FROM {name} WHERE user_id = ?"
+
+    def to_row(self, key, value):
+        if self.scalar:
+            value = {self.scalar: value}
+        row = [str(key)]
+        for column in self.columns:
+            item = value.get(column)
+            if column in self.json_columns:
+                item = json.dumps(item)
+            row.append(item)
+        return row
+
+    def from_row(self, row):
+        values = {}
+        for column, item in zip(self.columns, row[1:]):
+            if column in self.json_columns:
+                item = json.loads(item) if item is not None else None
+            values[column] = item
+        if self.scalar:
+            return values[self.scalar]
+        return values
+
+
+TABLES = {
+    "bank": Table("bank", {
+        "wallet": "INTEGER DEFAULT 0",
+        "bank": "INTEGER DEFAULT 0",
+        "last_work": "REAL",
+    }),
+    "levels": Table("levels", {
+        "xp": "INTEGER DEFAULT 0",
+        "level": "INTEGER DEFAULT 0",
+        "total_messages": "INTEGER DEFAULT 0",
+        "last_message": "REAL",
+    }),
+    "voice": Table("voice", {
+        "voice_time": "REAL DEFAULT 0",
+    }),
+    "user_jobs": Table("user_jobs", {"jobs": "TEXT NOT NULL"}, scalar="jobs", json_columns=("jobs",)),
+    "lastfm": Table("lastfm", {"username": "TEXT NOT NULL"}, scalar="username"),
+}
+
+
+class SqliteBackend:
+    """SQLite storage in WAL mode, writing only the rows that actually changed"""
+
+    name = "sqlite"
+    partial_writes = True  # save() only needs the keys being written
+
+    def __init__(self, path='data/bot.db'):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            for table in TABLES.values():
+                self.conn.execute(table.create_sql)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS documents (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def load(self, collection):
+        table = TABLES[collection]
+        with self.lock:
+            rows = self.conn.execute(table.select_sql).fetchall()
+        return {row[0]: table.from_row(row) for row in rows}
+
+    def get(self, collection, key):
+        table = TABLES[collection]
+        with self.lock:
+            row = self.conn.execute(table.get_sql, (str(key),)).fetchone()
+        return table.from_row(row) if row else None
+
+    def save(self, collection, data, keys=None):
+        """Upsert the given keys (or everything), deleting keys no longer in ``data``"""
+        table = TABLES[collection]
+        with self.lock, self.conn:
+            if keys is None:
+                existing = {row[0] for row in self.conn.execute(f"SELECT user_id FROM {table.name}")}
+                removed = existing - set(data)
+                keys = data.keys()
+            else:
+                keys = {str(k) for k in keys}
+                removed = {k for k in keys if k not in data}
+
+            self.conn.executemany(table.upsert_sql, [table.to_row(k, data[k]) for k in keys if k in data])
+            self.conn.executemany(table.delete_sql, [(k,) for k in removed])
+
+    def load_document(self, name, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM documents WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def save_document(self, name, value):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO documents (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (name, json.dumps(value))
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_backend = None
+
+
+def get_backend():
+    """The storage backend picked by the ``storage_backend`` env var (json or sqlite)"""
+    global _backend
+    if _backend is None:
+        if os.getenv("storage_backend", "json").lower() == "sqlite":
+            _backend = SqliteBackend(os.getenv("sqlite_path", 'data/bot.db'))
+        else:
+            _backend = JsonBackend()
+    return _backend
+
+
+# A single worker keeps writes to the same file in submission order
+io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-io")
+
+
+async def run_io(func, *args, **kwargs):
+    """Run blocking storage work on the I/O thread so the event loop keeps going"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(func, *args, **kwargs))
+
+
+async def load(collection):
+    return await run_io(lambda: get_backend().load(collection))
+
+
+async def get(collection, key):
+    return await run_io(lambda: get_backend().get(collection, key))
+
+
+async def save(collection, data, keys=None):
+    """Save a collection; ``data`` must not be mutated until this returns"""
+    await run_io(lambda: get_backend().save(collection, data, keys))
+
+
+async def load_document(name, default=None):
+    return await run_io(lambda: get_backend().load_document(name, default))
+
+
+async def save_document(name, value):
+    await run_io(lambda: get_backend().save_document(name, value))
+
+
+class CachedCollection:
+    """In-memory copy of a keyed collection with write-behind persistence.
+
+    Callers change ``data`` directly and call ``mark_dirty``; changed keys are saved in
+    one batch every ``flush_interval`` seconds, or as soon as ``flush_every`` changes
+    have piled up.
+    """
+
+    def __init__(self, name, flush_interval=5, flush_every=50):
+        self.name = name
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.data = {}
+        self.loaded = False
+        self.dirty = set()
+        self.pending = 0  # changes since the last flush
+        self._flush_task = None
+        self._early_flush = None
+
+    async def load(self):
+        self.data = await load(self.name)
+        self.dirty.clear()
+        self.pending = 0
+        self.loaded = True
+        return self.data
+
+    def mark_dirty(self, key):
+        self.dirty.add(str(key))
+        self.pending += 1
+        if self.pending >= self.flush_every and (self._early_flush is None or self._early_flush.done()):
+            self._early_flush = asyncio.create_task(self.flush())
+            self._early_flush.add_done_callback(self._early_flush_done)
+
+    def _early_flush_done(self, task):
+        # flush() has already put the keys back into dirty, the periodic flush retries them
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            print(f"Error flushing {self.name}: {error!r}")
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, set()
+        self.pending = 0
+
+        # Copy on the loop so the I/O thread never sees values that are being changed
+        if get_backend().partial_writes:
+            snapshot = {k: copy.copy(self.data[k]) for k in dirty if k in self.data}
+        else:
+            snapshot = {k: copy.copy(v) for k, v in self.data.items()}
+
+        try:
+            await save(self.name, snapshot, dirty)
+        except BaseException:
+            # Also when cancelled, so the keys aren't dropped without being saved
+            self.dirty |= dirty
+            raise
+
+    async def start(self):
+        """Load the collection and start the periodic flush task"""
+        if not self.loaded:
+            await self.load()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing {self.name}: {e}")
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+# Columns summed when verifying an import, per collection
+CHECKSUMS = {
+    "bank": ("wallet", "bank"),
+    "levels": ("xp", "total_messages"),
+    "voice": ("voice_time",),
+    "user_jobs": (),
+    "lastfm": (),
+}
+
+
+def summarize(backend, collection):
+    data = backend.load(collection)
+    sums = {}
+    for column in CHECKSUMS[collection]:
+        sums[column] = sum((value.get(column) or 0) for value in data.values())
+    if collection == "user_jobs":
+        sums["jobs"] = sum(len(jobs or []) for jobs in data.values())
+    return len(data), sums
+
+
+def import_json(sqlite_path='data/bot.db'):
+    """Copy every JSON collection into SQLite and check row counts and sums match"""
+    source = JsonBackend()
+    target = SqliteBackend(sqlite_path)
+    ok = True
+
+    for collection in TABLES:
+        target.save(collection, source.load(collection))
+
+        expected = summarize(source, collection)
+        actual = summarize(target, collection)
+        # voice_time is a float, allow for rounding in the last digits
+        matches = expected[0] == actual[0] and all(
+            abs(expected[1][c] - actual[1][c]) < 1e-6 for c in expected[1]
+        )
+        ok = ok and matches
+        print(f"{collection}: {actual[0]}/{expected[0]} rows, sums {actual[1]} "
+              f"{'OK' if matches else 'MISMATCH (expected ' + str(expected[1]) + ')'}")
+
+    target.save_document("current_jobs", source.load_document("current_jobs", []))
+    marks = source.load_document("bank_marks")
+    if marks is not None:
+        target.save_document("bank_marks", marks)
+    target.close()
+    return ok
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    load_dotenv()
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "import":
+        path = sys.argv[2] if len(sys.argv) > 2 else os.getenv("sqlite_path", 'data/bot.db')
+        sys.exit(0 if import_json(path) else 1)
+
+    print("Usage: python storage.py import [sqlite_path]")
+    sys.exit(2)
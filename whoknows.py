@@ -0,0 +1,73 @@
+import heapq
+
+
+class ArtistIndex:
+    """Inverted index from artist to the play count of every user who listened to it.
+
+    Artists are matched case-insensitively. Finding an artist is a dict lookup and its
+    top k listeners come from ``heapq.nlargest`` over that artist's listeners only, so a
+    query costs O(n log k) in the artist's listener count n, no matter how big the
+    libraries are. The index is fed incrementally with newly imported scrobbles.
+    """
+
+    def __init__(self):
+        self.listeners = {}  # artist key -> {username: plays}
+        self.names = {}  # artist key -> name as Last.fm spells it
+        self.user_artists = {}  # username -> artist keys, to drop a user quickly
+
+    @staticmethod
+    def key(artist):
+        return " ".join(artist.split()).casefold()
+
+    def __len__(self):
+        return len(self.listeners)
+
+    def rebuild(self, rows):
+        """Replace the index from (username, artist, plays) rows"""
+        self.listeners = {}
+        self.names = {}
+        self.user_artists = {}
+        for username, artist, plays in rows:
+            self.add(username, artist, plays)
+
+    def add(self, username, artist, plays=1):
+        key = self.key(artist)
+        listeners = self.listeners.setdefault(key, {})
+        listeners[username] = listeners.get(username, 0) + plays
+        self.names.setdefault(key, artist)
+        self.user_artists.setdefault(username, set()).add(key)
+
+    def add_scrobbles(self, username, scrobbles):
+        """Count (played_at, artist, ...) scrobbles in, as ScrobbleSync reports them"""
+        for scrobble in scrobbles:
+            self.add(username, scrobble[1])
+
+    def remove_user(self, username):
+        for key in self.user_artists.pop(username, ()):
+            listeners = self.listeners.get(key)
+            if listeners is None:
+                continue
+            listeners.pop(username, None)
+            if not listeners:
+                del self.listeners[key]
+                del self.names[key]
+
+    def name(self, artist):
+        return self.names.get(self.key(artist))
+
+    def top(self, artist, k=10, usernames=None):
+        """The k users with the most plays of an artist as (username, plays), best first.
+
+        ``usernames`` limits the result to those users, e.g. accounts linked in a server.
+        """
+        listeners = self.listeners.get(self.key(artist), {})
+        items = listeners.items()
+        if usernames is not None:
+            items = ((username, plays) for username, plays in items if username in usernames)
+        return heapq.nlargest(k, items, key=lambda item: (item[1], item[0]))
+
+    def listener_count(self, artist, usernames=None):
+        listeners = self.listeners.get(self.key(artist), {})
+        if usernames is None:
+            return len(listeners)
+        return sum(1 for username in listeners if username in usernames)